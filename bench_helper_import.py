@@ -0,0 +1,53 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from build_timing import BuildTimer
+
+PACKAGE_FOLDER = Path("./packages")
+REPORT_FILE = Path("./helper_importtime.json")
+IMPORTTIME_PATTERN = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def helper_modules():
+    folder = PACKAGE_FOLDER / "helper"
+    return sorted(path.stem for path in folder.glob("*.py") if path.stem != "__init__")
+
+
+def measure_import(module, repeat=3):
+    """
+    Return the smallest cumulative `-X importtime` of `module` in seconds,
+    each run in a fresh interpreter, or None when the import fails.
+    """
+    env = dict(os.environ, PYTHONPATH=str(PACKAGE_FOLDER.resolve()))
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        if proc.returncode != 0:
+            return None
+        for self_us, cumulative_us, name in IMPORTTIME_PATTERN.findall(proc.stderr):
+            if name == module:
+                seconds = int(cumulative_us) / 1e6
+                best = seconds if best is None else min(best, seconds)
+    return best
+
+
+if __name__ == "__main__":
+    # python bench_helper_import.py [module ...]
+    # compare with: python build_timing.py compare helper_importtime.json <baseline>
+    timer = BuildTimer("helper importtime")
+    for name in sys.argv[1:] or helper_modules():
+        module = name if name.startswith("helper") else f"helper.{name}"
+        seconds = measure_import(module)
+        if seconds is None:
+            print(f"{module:<24} import failed")
+            continue
+        timer.add(f"import:{module}", seconds=seconds)
+        print(f"{module:<24} {seconds * 1000:>9.1f} ms")
+    timer.write(REPORT_FILE)
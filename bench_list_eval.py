@@ -0,0 +1,104 @@
+import sys
+import time
+from pathlib import Path
+from build_timing import BuildTimer
+
+PACKAGE_FOLDER = Path("./packages")
+sys.path.insert(0, str(PACKAGE_FOLDER))
+import numpy as np  # noqa: E402
+import polars as pl  # noqa: E402
+from helper.polars import LIST_EVAL_ROW_INDEX, list_eval, list_eval_regroup  # noqa: E402
+
+REPORT_FILE = Path("./list_eval_bench.json")
+ROW_COUNTS = [10_000, 100_000]
+# list length distributions, (name, function of (rng, rows) returning the lengths)
+LENGTHS = [
+    ("short", lambda rng, rows: rng.integers(0, 5, rows)),
+    ("long", lambda rng, rows: rng.integers(0, 200, rows)),
+    ("skewed", lambda rng, rows: np.minimum(rng.pareto(1.2, rows) * 4, 2000).astype(int)),
+]
+EXPRS = [
+    ("elementwise", (pl.col("x") * 10 + 1).alias("y")),
+    ("aggregation", pl.col("x").sum().alias("y")),
+]
+
+
+def make_frame(lengths):
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    values = np.arange(offsets[-1])
+    return pl.DataFrame({"x": [values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]})
+
+
+def unsorted(s):
+    """A copy of `s` without the sorted flag, so that a group by on it hashes."""
+    return pl.Series(s.name, s.to_numpy())
+
+
+def sorted_regroup(lf, expr):
+    """Explode and group by the row index flagged as sorted: the groups are slices."""
+    return (
+        lf.with_row_index(LIST_EVAL_ROW_INDEX)
+        .explode("x")
+        .with_columns(pl.col(LIST_EVAL_ROW_INDEX).set_sorted())
+        .group_by(LIST_EVAL_ROW_INDEX, maintain_order=True)
+        .agg(expr)
+        .drop(LIST_EVAL_ROW_INDEX)
+    )
+
+
+def hash_regroup(lf, expr):
+    """The same group by on a row index without the sorted flag: every element is hashed."""
+    return (
+        lf.with_row_index(LIST_EVAL_ROW_INDEX)
+        .explode("x")
+        .with_columns(pl.col(LIST_EVAL_ROW_INDEX).map_batches(unsorted))
+        .group_by(LIST_EVAL_ROW_INDEX, maintain_order=True)
+        .agg(expr)
+        .drop(LIST_EVAL_ROW_INDEX)
+    )
+
+
+def group_key_flags(df):
+    """Sorted flags of the group key of list_eval_regroup, SORTED_ASC means slices."""
+    key = (
+        df.lazy().with_row_index(LIST_EVAL_ROW_INDEX)
+        .explode("x")
+        .with_columns(pl.col(LIST_EVAL_ROW_INDEX).set_sorted())
+        .collect()[LIST_EVAL_ROW_INDEX]
+    )
+    return key.flags
+
+
+def best_time(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+if __name__ == "__main__":
+    # python bench_list_eval.py
+    # compare with: python build_timing.py compare list_eval_bench.json <baseline>
+    timer = BuildTimer("list_eval benchmark")
+    rng = np.random.default_rng(0)
+    print(f"regroup key flags: {group_key_flags(make_frame([2, 0, 3]))}")
+    for rows in ROW_COUNTS:
+        for length_name, lengths in LENGTHS:
+            df = make_frame(lengths(rng, rows))
+            elements = df["x"].list.len().sum()
+            for expr_name, expr in EXPRS:
+                approaches = [
+                    ("list_eval", lambda: list_eval(df, expr)),
+                    ("regroup", lambda: list_eval_regroup(df.lazy(), [expr]).collect()),
+                    ("sorted_regroup", lambda: sorted_regroup(df.lazy(), expr).collect()),
+                    ("hash_regroup", lambda: hash_regroup(df.lazy(), expr).collect()),
+                ]
+                for approach, func in approaches:
+                    seconds = best_time(func)
+                    name = f"{approach}:{expr_name}:{length_name}:{rows}"
+                    timer.add(name, seconds=seconds)
+                    print(f"{name:<44} {elements:>10} elements {seconds * 1000:>9.1f} ms")
+    timer.write(REPORT_FILE)
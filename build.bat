@@ -1,5 +1,10 @@
 jupyter lite build --contents content --output-dir dist --pyodide pyodide.tar.bz2
 python utils.py patch
+python preload.py dist
 copy /y patch\568.01d8de54f0240b4168bd.js dist\extensions\jupyterlab-open-url-parameter\static\
 copy /y patch\122.99bdb660447bc558238a.js dist\extensions\ipyevents\static\
-python fix_content.py
\ No newline at end of file
+python prebuild.py dist
+python content_optimize.py dist
+python data_convert.py dist
+python content_index.py dist --compact
+python search_index.py dist
\ No newline at end of file
@@ -0,0 +1,126 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPORT_FILE = Path("./build_report.json")
+BASELINE_FILE = Path("./build_baseline.json")
+# a stage regressed when it is this much slower than the baseline...
+REGRESSION_RATIO = 1.25
+# ...and at least this many seconds slower, so that tiny stages don't flap
+REGRESSION_SECONDS = 0.2
+
+
+@dataclass
+class StageStats:
+    seconds: float = 0.0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+class BuildTimer:
+    """
+    Collect per-stage statistics of a build and write them to a JSON report.
+
+    Example
+    -------
+
+    ```python
+    timer = BuildTimer("patch")
+    with timer.stage("copy wheels") as stats:
+        stats.bytes_written += copy_files()
+    timer.write()
+    ```
+    """
+
+    def __init__(self, command):
+        self.command = command
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        stats = self.stages.setdefault(name, StageStats())
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds += time.perf_counter() - start
+
+    def add(self, name, **values):
+        """Record a stage that was measured elsewhere, e.g. in a worker process."""
+        stats = self.stages.setdefault(name, StageStats())
+        for key, value in values.items():
+            setattr(stats, key, getattr(stats, key) + value)
+        return stats
+
+    def report(self):
+        return {
+            "command": self.command,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "total_seconds": sum(
+                stats.seconds for name, stats in self.stages.items() if ":" not in name
+            ),
+            "stages": {name: asdict(stats) for name, stats in self.stages.items()},
+        }
+
+    def write(self, path=REPORT_FILE):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=4)
+
+
+def load_report(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_reports(report, baseline, ratio=REGRESSION_RATIO, min_seconds=REGRESSION_SECONDS):
+    """
+    Compare the stage times of two reports.
+
+    Returns:
+        list: (stage, baseline seconds, seconds, regressed) for every stage
+        of `report`; stages missing from the baseline have None as baseline.
+    """
+    rows = []
+    for name, stats in report["stages"].items():
+        old = baseline["stages"].get(name)
+        seconds = stats["seconds"]
+        if old is None:
+            rows.append((name, None, seconds, False))
+            continue
+        regressed = seconds > old["seconds"] * ratio and seconds - old["seconds"] > min_seconds
+        rows.append((name, old["seconds"], seconds, regressed))
+    return rows
+
+
+def print_comparison(rows):
+    width = max([len(row[0]) for row in rows] + [5])
+    print(f"{'stage':<{width}} {'baseline':>10} {'current':>10}")
+    for name, old, new, regressed in rows:
+        old_text = "-" if old is None else f"{old:.3f}"
+        flag = "  ⚠️ regressed" if regressed else ""
+        print(f"{name:<{width}} {old_text:>10} {new:>10.3f}{flag}")
+
+
+if __name__ == "__main__":
+    # python build_timing.py compare [report] [baseline]
+    # python build_timing.py baseline [report]
+    args = sys.argv[2:]
+    if sys.argv[1] == "compare":
+        report = load_report(args[0] if args else REPORT_FILE)
+        baseline = load_report(args[1] if len(args) > 1 else BASELINE_FILE)
+        rows = compare_reports(report, baseline)
+        print_comparison(rows)
+        if any(row[3] for row in rows):
+            sys.exit(1)
+
+    elif sys.argv[1] == "baseline":
+        report = load_report(args[0] if args else REPORT_FILE)
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"baseline saved to {BASELINE_FILE}")
@@ -0,0 +1,74 @@
+import gzip
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_PATTERNS = ["*.json", "*.whl", "*.wasm"]
+SIZES_MANIFEST_NAME = "compressed-sizes.json"
+
+
+def is_up_to_date(src, dst):
+    return dst.exists() and dst.stat().st_mtime_ns >= src.stat().st_mtime_ns
+
+
+def compress_file(path):
+    """
+    Write `.gz` and, when brotli is installed, `.br` siblings of a file.
+
+    The gzip header has no timestamp and no file name, so the output only
+    depends on the content.
+    """
+    path = Path(path)
+    data = None
+    sizes = {"raw": path.stat().st_size}
+
+    gz_path = path.with_name(path.name + ".gz")
+    if not is_up_to_date(path, gz_path):
+        data = path.read_bytes()
+        with open(gz_path, "wb") as f:
+            with gzip.GzipFile(filename="", mode="wb", fileobj=f, compresslevel=9, mtime=0) as gz:
+                gz.write(data)
+    sizes["gz"] = gz_path.stat().st_size
+
+    if brotli is not None:
+        br_path = path.with_name(path.name + ".br")
+        if not is_up_to_date(path, br_path):
+            if data is None:
+                data = path.read_bytes()
+            br_path.write_bytes(brotli.compress(data, quality=11))
+        sizes["br"] = br_path.stat().st_size
+
+    return path.name, sizes
+
+
+def precompress_folder(folder, patterns=COMPRESS_PATTERNS, max_workers=None, stats=None):
+    """
+    Precompress the files of `folder` matching `patterns` in parallel and
+    write a manifest of the raw and compressed sizes.
+    """
+    folder = Path(folder)
+    if brotli is None:
+        print("⚠️ brotli is not installed, only .gz files are written")
+
+    files = sorted(
+        {path for pattern in patterns for path in folder.glob(pattern)}
+        - {folder / SIZES_MANIFEST_NAME}
+    )
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        sizes = dict(pool.map(compress_file, files))
+
+    with open(folder / SIZES_MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(sizes, f, indent=4, sort_keys=True)
+
+    raw = sum(item["raw"] for item in sizes.values())
+    gz = sum(item["gz"] for item in sizes.values())
+    if stats is not None:
+        stats.bytes_read += raw
+        stats.bytes_written += sum(item["gz"] + item.get("br", 0) for item in sizes.values())
+    print(f"precompressed {len(sizes)} files: {raw} -> {gz} bytes (gzip)")
+    return sizes
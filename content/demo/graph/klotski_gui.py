@@ -86,9 +86,16 @@ BCCB
 BDDB
 D..D
 """    
+
+
+def board_status(text):
+    return ''.join(text.split()).strip().replace('.', ' ')
+
     
 class KlotskiSolverGUI:
-    def __init__(self):        
+    def __init__(self, solutions=None):        
+        # {status: path} of boards solved in advance, e.g. by a prebuild cell
+        self.solutions = solutions or {}
         width, height = 200, 250
         self.canvas = Canvas(width=width, height=height, layout=ipw.Layout(width=f'{width}px', height=f'{height}px'))
         self.event = Event(source=self.canvas, watched_events=['keydown'])
@@ -119,7 +126,7 @@ class KlotskiSolverGUI:
     def solve(self):
         self.pause = True
         self.play_button.description = 'Play'
-        status = ''.join(self.text_area.value.split()).strip().replace('.', ' ')
+        status = board_status(self.text_area.value)
         self.init_rectangles(status)
         
     def draw(self):
@@ -142,7 +149,10 @@ class KlotskiSolverGUI:
             h, w = SIZES[name]
             self.rectangles[r, c] = Rectangle(color=COLORS[i], x=c, y=r, w=w, h=h)
             
-        self.solution = list(find_path(status))
+        if status in self.solutions:
+            self.solution = list(self.solutions[status])
+        else:
+            self.solution = list(find_path(status))
         self.solution.insert(0, status)
         self.current_index = 0
         self.draw()
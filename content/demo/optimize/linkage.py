@@ -104,7 +104,13 @@ class JansenLinkage:
             r = optimize.minimize(self.error_func, init, args=(angle_init,), method="L-BFGS-B")
             init = r.x
             positions.append(r.x)
-        self.positions = np.vstack(positions)        
+        self.positions = np.vstack(positions)
+        return dict(angles=self.angles, positions=self.positions)
+
+    def set_positions(self, result):
+        """Use the result of `solve_positions`, e.g. loaded by `cached_result`."""
+        self.angles = result["angles"]
+        self.positions = result["positions"]
 
     def make_gui(self):
         self.canvas = Canvas(width=self.size, height=self.size)
@@ -1,3 +1,6 @@
+import sys
+import tempfile
+from pathlib import Path
 import numpy as np
 from cffi import FFI
 import matplotlib.pyplot as plt
@@ -40,7 +43,22 @@ void buddhabrot_grid(
 """)
 
 
-lib = ffi.dlopen("buddhabrot.wasm")
+def load_native_lib():
+    """Compile buddhabrot.c for CPython, e.g. for a prebuild cell."""
+    import importlib.util
+    build_folder = tempfile.mkdtemp()
+    ffi.set_source("_buddhabrot", Path(__file__).with_name("buddhabrot.c").read_text())
+    module_path = ffi.compile(tmpdir=build_folder)
+    spec = importlib.util.spec_from_file_location("_buddhabrot", module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.lib
+
+
+if sys.platform == "emscripten":
+    lib = ffi.dlopen("buddhabrot.wasm")
+else:
+    lib = load_native_lib()
 
 def buddhabrot_grid(width, height, max_iter, scale, x_range=(-2.0, 1.0), y_range=(-1.5, 1.5)):
     x_min, x_max = x_range
@@ -83,7 +101,16 @@ def buddhabrot_random(width, height, max_iter, n_samples, x_range=(-2.0, 1.0), y
     return np.rot90(image) / image.max()
 
 
-def buddhabrot_gui():
+def show_image(img, title, cmap):
+    plt.figure(figsize=(5, 5))
+    plt.imshow(np.log1p(img), cmap=cmap, origin="lower")
+    plt.title(title)
+    plt.axis("off")
+    plt.show()
+
+
+def buddhabrot_gui(image=None):
+    """`image` is shown before the first run, e.g. computed by a prebuild cell."""
     func_selector = RadioButtons(
     options=["buddhabrot_grid", "buddhabrot_random"],
     value="buddhabrot_random",
@@ -144,13 +171,12 @@ def buddhabrot_gui():
                 n_samples = samples_slider.value
                 img = buddhabrot_random(width, height, max_iter, n_samples)
     
-            plt.figure(figsize=(5, 5))
-            plt.imshow(np.log1p(img), cmap=cmap, origin="lower")
-            plt.title(f"{func_selector.value} (size={width}, scale={scale})")
-            plt.axis("off")
-            plt.show()
+            show_image(img, f"{func_selector.value} (size={width}, scale={scale})", cmap)
     
     run_button.on_click(on_run_button_clicked)
+    if image is not None:
+        with output:
+            show_image(image, f"buddhabrot_random (size={len(image)})", colormap_selector.value)
     
     ui = VBox([
         HBox([func_selector, size_selector]),
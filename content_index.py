@@ -0,0 +1,160 @@
+import hashlib
+import json
+import mimetypes
+import os
+import stat
+import sys
+from datetime import datetime, timezone
+from fnmatch import fnmatch
+from pathlib import Path
+
+DIST_FOLDER = Path("./dist")
+MANIFEST_FILE = Path("./content_index_manifest.json")
+HIDE_GLOBS = ["__pycache__", "*.pyc", "*.pyo", ".DS_Store", "*~", "*.so", "*.dylib"]
+
+
+def isoformat(timestamp):
+    dt = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def should_list(name):
+    return not name.startswith(".") and not any(fnmatch(name, glob) for glob in HIDE_GLOBS)
+
+
+def entry_model(path, name, st, is_dir):
+    """Contents model of a directory entry, without its content."""
+    if is_dir:
+        kind, mimetype, size = "directory", None, None
+    elif name.endswith(".ipynb"):
+        kind, mimetype, size = "notebook", None, st.st_size
+    else:
+        kind, mimetype, size = "file", mimetypes.guess_type(name)[0], st.st_size
+    return {
+        "content": None,
+        "created": isoformat(st.st_ctime),
+        "format": None,
+        "hash": None,
+        "hash_algorithm": None,
+        "last_modified": isoformat(st.st_mtime),
+        "mimetype": mimetype,
+        "name": name,
+        "path": path,
+        "size": size,
+        "type": kind,
+        "writable": True,
+    }
+
+
+def scan_directory(files_folder, rel_path):
+    """Return (sorted child models, sub directories, directory stat) of one folder."""
+    children = []
+    sub_dirs = []
+    folder = files_folder / rel_path if rel_path else files_folder
+    with os.scandir(folder) as it:
+        for entry in it:
+            if not should_list(entry.name):
+                continue
+            st = entry.stat()
+            is_dir = stat.S_ISDIR(st.st_mode)
+            if not is_dir and not stat.S_ISREG(st.st_mode):
+                continue
+            path = f"{rel_path}/{entry.name}" if rel_path else entry.name
+            children.append(entry_model(path, entry.name, st, is_dir))
+            if is_dir:
+                sub_dirs.append(path)
+    children.sort(key=lambda model: model["name"])
+    return children, sub_dirs, folder.stat()
+
+
+def listing_hash(children, dir_stat):
+    h = hashlib.sha256()
+    h.update(json.dumps([dir_stat.st_mtime, dir_stat.st_ctime]).encode())
+    for model in children:
+        h.update(json.dumps(model, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def write_listing(api_path, rel_path, children, dir_stat, compact=False):
+    """Stream a directory model to `api_path`, one child at a time."""
+    model = entry_model(rel_path, rel_path.rsplit("/", 1)[-1], dir_stat, True)
+    model["format"] = "json"
+    del model["content"]
+
+    if compact:
+        dump = lambda obj: json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        head, sep, tail = '{"content":[', ",", "],"
+        rest = dump(model)[1:-1]
+    else:
+        dump = lambda obj: json.dumps(obj, sort_keys=True, indent=2, ensure_ascii=False)
+        head, sep, tail = '{\n  "content": [\n', ",\n", "\n  ],\n"
+        rest = dump(model)[2:-2]
+
+    api_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = api_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(head)
+        for i, child in enumerate(children):
+            if i:
+                f.write(sep)
+            text = dump(child)
+            f.write(text if compact else "\n".join("    " + line for line in text.splitlines()))
+        f.write(tail)
+        f.write(rest)
+        f.write("}" if compact else "\n}\n")
+    tmp_path.replace(api_path)
+
+
+def build_contents_index(dist_folder=DIST_FOLDER, compact=False, manifest_file=MANIFEST_FILE):
+    """
+    Write `all.json` for every directory of `dist/files`.
+
+    Returns:
+        tuple: (number of rewritten listings, number of unchanged listings)
+    """
+    dist_folder = Path(dist_folder)
+    files_folder = dist_folder / "files"
+    api_folder = dist_folder / "api" / "contents"
+
+    manifest = {}
+    if manifest_file.exists():
+        with open(manifest_file, encoding="utf-8") as f:
+            manifest = json.load(f)
+    if manifest.get("compact") != compact:
+        manifest = {}
+    old_dirs = manifest.get("dirs", {})
+
+    dirs = {}
+    written = 0
+    todo = [""]
+    while todo:
+        rel_path = todo.pop()
+        children, sub_dirs, dir_stat = scan_directory(files_folder, rel_path)
+        todo.extend(sub_dirs)
+        api_path = api_folder / rel_path / "all.json"
+        digest = listing_hash(children, dir_stat)
+        # the stored mtime detects listings regenerated by `jupyter lite build`
+        old = old_dirs.get(rel_path)
+        if old is not None and old[0] == digest and api_path.exists() and api_path.stat().st_mtime_ns == old[1]:
+            dirs[rel_path] = old
+            continue
+        write_listing(api_path, rel_path, children, dir_stat, compact=compact)
+        dirs[rel_path] = [digest, api_path.stat().st_mtime_ns]
+        written += 1
+
+    for rel_path in set(old_dirs) - set(dirs):
+        stale = api_folder / rel_path / "all.json"
+        if stale.exists():
+            stale.unlink()
+
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump({"compact": compact, "dirs": dirs}, f, indent=2, sort_keys=True)
+    return written, len(dirs) - written
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    written, unchanged = build_contents_index(
+        Path(args[0]) if args else DIST_FOLDER, compact="--compact" in sys.argv
+    )
+    print(f"contents index: {written} written, {unchanged} unchanged")
@@ -0,0 +1,227 @@
+import base64
+import hashlib
+import json
+import os
+import struct
+import sys
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+DIST_FOLDER = Path("./dist")
+ASSETS_FOLDER_NAME = ".assets"
+REPORT_FILE = Path("./content_optimize_report.json")
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+@dataclass
+class OutputPolicy:
+    """
+    How the outputs of shipped notebooks are reduced.
+
+    strip_outputs: Remove all outputs and execution counts.
+    max_output_size: Replace single outputs larger than this many bytes
+        with a short note, None keeps all outputs.
+    image_threshold: Embedded PNGs of at least this many bytes are moved
+        to shared files, None keeps them embedded.
+    """
+
+    strip_outputs: bool = False
+    max_output_size: int | None = None
+    image_threshold: int | None = 32 * 1024
+
+
+def iter_png_chunks(data):
+    pos = len(PNG_SIGNATURE)
+    while pos < len(data):
+        (length,) = struct.unpack(">I", data[pos : pos + 4])
+        kind = data[pos + 4 : pos + 8]
+        yield kind, data[pos + 8 : pos + 8 + length]
+        pos += 12 + length
+
+
+def png_chunk(kind, body):
+    crc = zlib.crc32(kind + body) & 0xFFFFFFFF
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", crc)
+
+
+def recompress_png(data):
+    """
+    Losslessly recompress a PNG by deflating its image data with the
+    highest compression level into a single IDAT chunk.
+
+    Returns the original bytes when that is not smaller.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return data
+    try:
+        chunks = list(iter_png_chunks(data))
+        idat = b"".join(body for kind, body in chunks if kind == b"IDAT")
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9)
+        idat = compressor.compress(zlib.decompress(idat)) + compressor.flush()
+    except (struct.error, zlib.error):
+        return data
+
+    out = [PNG_SIGNATURE]
+    for kind, body in chunks:
+        if kind == b"IDAT":
+            if idat is not None:
+                out.append(png_chunk(b"IDAT", idat))
+                idat = None
+        else:
+            out.append(png_chunk(kind, body))
+    result = b"".join(out)
+    return result if len(result) < len(data) else data
+
+
+def join_text(value):
+    return "".join(value) if isinstance(value, list) else value
+
+
+class ContentOptimizer:
+    """
+    Shrink the notebooks of a built site in `dist/files`, only notebooks
+    whose content changes are written.
+
+    Large PNGs are written once to `files/.assets/<sha256>.png` and their
+    output becomes a `text/markdown` image link relative to the notebook.
+    JupyterLab resolves the link against the notebook folder to the
+    `files/` URL the site serves the asset from, and nbconvert keeps it as
+    a markdown image. An image shown by several notebooks is downloaded
+    once and then cached by the browser.
+
+    Example
+    -------
+
+    ```python
+    optimizer = ContentOptimizer("dist/files", OutputPolicy(max_output_size=200_000))
+    report = optimizer.run()
+    ```
+    """
+
+    def __init__(self, files_folder, policy=None):
+        self.files_folder = Path(files_folder)
+        self.assets_folder = self.files_folder / ASSETS_FOLDER_NAME
+        self.policy = policy or OutputPolicy()
+        self.recompressed = 0
+        # {asset name: [size, references]}
+        self.assets = {}
+
+    def store_asset(self, data):
+        """Write an image to the content-addressed assets folder, return its name."""
+        name = f"{hashlib.sha256(data).hexdigest()}.png"
+        path = self.assets_folder / name
+        if not path.exists():
+            self.assets_folder.mkdir(exist_ok=True)
+            path.write_bytes(data)
+        self.assets.setdefault(name, [len(data), 0])[1] += 1
+        return name
+
+    def optimize_image(self, output, notebook_path):
+        data = output["data"]
+        original = base64.b64decode(join_text(data["image/png"]))
+        png = recompress_png(original)
+        self.recompressed += len(original) - len(png)
+        threshold = self.policy.image_threshold
+        if threshold is None or len(png) < threshold or "text/markdown" in data:
+            if png != original:
+                data["image/png"] = base64.b64encode(png).decode("ascii")
+            return
+
+        name = self.store_asset(png)
+        rel = Path(os.path.relpath(self.assets_folder / name, notebook_path.parent)).as_posix()
+        del data["image/png"]
+        output.get("metadata", {}).pop("image/png", None)
+        data["text/markdown"] = f"![output]({rel})"
+
+    def asset_report(self):
+        """Files, bytes and references of the assets, and the bytes the sharing saves."""
+        return {
+            "files": len(self.assets),
+            "bytes": sum(size for size, _ in self.assets.values()),
+            "references": sum(refs for _, refs in self.assets.values()),
+            "dedup_saved": sum(size * (refs - 1) for size, refs in self.assets.values()),
+        }
+
+    def optimize_outputs(self, cell, notebook_path):
+        max_size = self.policy.max_output_size
+        outputs = []
+        for output in cell.get("outputs", []):
+            if "image/png" in output.get("data", {}):
+                self.optimize_image(output, notebook_path)
+            if max_size is not None:
+                size = len(json.dumps(output))
+                if size > max_size:
+                    output = {
+                        "name": "stdout",
+                        "output_type": "stream",
+                        "text": [f"[output removed from the shipped notebook: {size} bytes]\n"],
+                    }
+            outputs.append(output)
+        cell["outputs"] = outputs
+
+    def optimize_notebook(self, path):
+        """Optimize one notebook in place, return (bytes before, bytes after)."""
+        before = path.stat().st_size
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        nb = json.loads(text)
+
+        for cell in nb.get("cells", []):
+            if cell["cell_type"] != "code":
+                continue
+            if self.policy.strip_outputs:
+                cell["outputs"] = []
+                cell["execution_count"] = None
+            else:
+                self.optimize_outputs(cell, path)
+
+        if nb == json.loads(text):
+            return before, before
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(nb, f, indent=1, ensure_ascii=False)
+            f.write("\n")
+        return before, path.stat().st_size
+
+    def run(self):
+        """Optimize every notebook, return {notebook path: bytes saved}."""
+        report = {}
+        for path in sorted(self.files_folder.rglob("*.ipynb")):
+            if ".ipynb_checkpoints" in path.parts:
+                continue
+            before, after = self.optimize_notebook(path)
+            report[path.relative_to(self.files_folder).as_posix()] = before - after
+        return report
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    dist_folder = Path(args[0]) if args else DIST_FOLDER
+
+    policy = OutputPolicy(strip_outputs="--strip-outputs" in sys.argv)
+    for arg in sys.argv[1:]:
+        if arg.startswith("--max-output-size="):
+            policy.max_output_size = int(arg.split("=", 1)[1])
+        elif arg.startswith("--image-threshold="):
+            value = arg.split("=", 1)[1]
+            policy.image_threshold = None if value == "none" else int(value)
+
+    optimizer = ContentOptimizer(dist_folder / "files", policy)
+    report = optimizer.run()
+    for name, saved in sorted(report.items(), key=lambda item: -item[1]):
+        if saved:
+            print(f"{saved:>10} {name}")
+    assets = optimizer.asset_report()
+    print(f"{sum(report.values()):>10} bytes saved in the notebooks")
+    print(f"{optimizer.recompressed:>10} bytes saved by recompressing PNGs")
+    print(
+        f"{assets['bytes']:>10} bytes in {assets['files']} shared images for {assets['references']} outputs, "
+        f"{assets['dedup_saved']} bytes saved by sharing"
+    )
+
+    with open(REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(
+            {"notebooks": report, "recompressed": optimizer.recompressed, "assets": assets},
+            f,
+            indent=4,
+        )
@@ -0,0 +1,112 @@
+import json
+import sys
+from pathlib import Path
+from wheels import file_sha256
+
+PACKAGE_FOLDER = Path("./packages")
+sys.path.insert(0, str(PACKAGE_FOLDER))
+
+try:
+    import polars as pl
+    # the manifest format is shared with helper.polars.read_data, which runs in the kernel
+    from helper.polars import DATA_MANIFEST_NAME, KNOCKS_SCHEMA_OVERRIDES, schema_key
+except ImportError:
+    pl = None
+    KNOCKS_SCHEMA_OVERRIDES = None
+
+DIST_FOLDER = Path("./dist")
+DATA_FOLDER_GLOB = "*/data"
+# schema overrides per data folder, relative to the files folder
+DATA_SCHEMA_OVERRIDES = {
+    "polars_guide/data": KNOCKS_SCHEMA_OVERRIDES,
+}
+PARQUET_COMPRESSION_LEVEL = 19
+
+
+def convert_csv(path, schema_overrides=None):
+    """
+    Write a zstd Parquet file next to a CSV file.
+
+    Returns:
+        dict: the manifest entry of the CSV file.
+    """
+    df = pl.read_csv(path, schema_overrides=schema_overrides)
+    dst = path.with_suffix(".parquet")
+    df.write_parquet(dst, compression="zstd", compression_level=PARQUET_COMPRESSION_LEVEL)
+    return {
+        "file": dst.name,
+        "columns": df.columns,
+        "schema_overrides": schema_key(schema_overrides, df.columns),
+        "source_size": path.stat().st_size,
+        "source_sha256": file_sha256(path),
+        "size": dst.stat().st_size,
+    }
+
+
+def convert_data_folder(folder, schema_overrides=None, stats=None):
+    """
+    Convert the CSV files of `folder` to Parquet and write the manifest that
+    maps them to the converted files.
+
+    Files whose content and overrides are unchanged since the last run are
+    not converted again, and files polars cannot parse are left as CSV.
+    """
+    manifest_file = folder / DATA_MANIFEST_NAME
+    old_manifest = {}
+    if manifest_file.exists():
+        with open(manifest_file, encoding="utf-8") as f:
+            old_manifest = json.load(f)
+
+    manifest = {}
+    for path in sorted(folder.glob("*.csv")):
+        old = old_manifest.get(path.name)
+        if (
+            old is not None
+            and (folder / old["file"]).exists()
+            and old["source_sha256"] == file_sha256(path)
+            and old["schema_overrides"] == schema_key(schema_overrides, old["columns"])
+        ):
+            manifest[path.name] = old
+            if stats is not None:
+                stats.cache_hits += 1
+            continue
+        try:
+            entry = convert_csv(path, schema_overrides)
+        except pl.exceptions.PolarsError as e:
+            print(f"⚠️ {path} is not converted: {e}")
+            continue
+        manifest[path.name] = entry
+        print(f"convert {path}: {entry['source_size']} -> {entry['size']} bytes")
+        if stats is not None:
+            stats.cache_misses += 1
+            stats.bytes_read += entry["source_size"]
+            stats.bytes_written += entry["size"]
+
+    for name in set(old_manifest) - set(manifest):
+        (folder / old_manifest[name]["file"]).unlink(missing_ok=True)
+
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def convert_data(dist_folder=DIST_FOLDER, stats=None):
+    """Convert every `*/data` folder of `dist/files`, return {folder: manifest}."""
+    files_folder = Path(dist_folder) / "files"
+    if pl is None:
+        print("⚠️ polars is not installed, the data files are shipped as CSV only")
+        return {}
+    manifests = {}
+    for folder in sorted(files_folder.glob(DATA_FOLDER_GLOB)):
+        rel_folder = folder.relative_to(files_folder).as_posix()
+        manifests[rel_folder] = convert_data_folder(folder, DATA_SCHEMA_OVERRIDES.get(rel_folder), stats)
+    return manifests
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    manifests = convert_data(Path(args[0]) if args else DIST_FOLDER)
+    for rel_folder, manifest in manifests.items():
+        source = sum(entry["source_size"] for entry in manifest.values())
+        converted = sum(entry["size"] for entry in manifest.values())
+        print(f"{rel_folder}: {len(manifest)} files, {source} -> {converted} bytes")
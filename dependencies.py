@@ -0,0 +1,212 @@
+import re
+import zipfile
+from email.parser import Parser
+from packaging.requirements import InvalidRequirement, Requirement
+
+# Marker environment of the Pyodide runtime the packages are installed into.
+PYODIDE_MARKER_ENV = {
+    "implementation_name": "cpython",
+    "implementation_version": "3.12.7",
+    "os_name": "posix",
+    "platform_machine": "wasm32",
+    "platform_python_implementation": "CPython",
+    "platform_system": "Emscripten",
+    "python_full_version": "3.12.7",
+    "python_version": "3.12",
+    "sys_platform": "emscripten",
+    "extra": "",
+}
+
+# Installed by the Pyodide kernel itself, so they never appear in the lock.
+KERNEL_PROVIDED = {
+    "comm",
+    "ipykernel",
+    "ipython",
+    "jupyter-client",
+    "jupyter-core",
+    "piplite",
+    "pyodide-kernel",
+    "traitlets",
+    "widgetsnbextension",
+}
+
+
+def normalize_name(name):
+    """PEP 503 normalization, the lock mixes `-`, `_` and case."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def parse_requires_dist(lines):
+    """Return the names of the requirements that apply to Pyodide."""
+    names = []
+    for line in lines:
+        try:
+            req = Requirement(line)
+        except InvalidRequirement:
+            print(f"⚠️ Skipping invalid requirement: {line}")
+            continue
+        if req.marker is not None and not req.marker.evaluate(PYODIDE_MARKER_ENV):
+            continue
+        name = normalize_name(req.name)
+        if name not in KERNEL_PROVIDED and name not in names:
+            names.append(name)
+    return names
+
+
+def read_wheel_requires(wheel_path):
+    """Read Requires-Dist from the METADATA file inside a wheel."""
+    with zipfile.ZipFile(wheel_path) as zf:
+        for name in zf.namelist():
+            parts = name.split("/")
+            if len(parts) == 2 and parts[0].endswith(".dist-info") and parts[1] == "METADATA":
+                metadata = Parser().parsestr(zf.read(name).decode("utf-8"))
+                return parse_requires_dist(metadata.get_all("Requires-Dist") or [])
+    return []
+
+
+def read_release_requires(data):
+    """Read requires_dist from PyPI release metadata."""
+    if data is None:
+        return []
+    return parse_requires_dist(data["info"].get("requires_dist") or [])
+
+
+def merge_depends(*depends):
+    """Merge dependency lists, deduplicating by normalized name."""
+    names = {}
+    for items in depends:
+        for name in items:
+            names.setdefault(normalize_name(name), name)
+    return sorted(names.values())
+
+
+class DependencyGraph:
+    """
+    Dependency graph of the packages of a `pyodide-lock.json`.
+
+    Example
+    -------
+
+    ```python
+    graph = DependencyGraph(lock["packages"])
+    graph.fix_depends()
+    graph.load_waves(["panel"])
+    ```
+    """
+
+    def __init__(self, packages):
+        self.packages = packages
+        self.names = {normalize_name(name): name for name in packages}
+
+    def lookup(self, name):
+        """Return the lock key of a dependency name, or None."""
+        return self.names.get(normalize_name(name))
+
+    def fix_depends(self, names=None):
+        """
+        Rewrite `depends` to lock keys and drop the ones that are not in the lock.
+
+        Returns:
+            dict: {package: [missing dependency, ...]}
+        """
+        missing = {}
+        for name in names if names is not None else self.packages:
+            depends = []
+            for dep in self.packages[name]["depends"]:
+                key = self.lookup(dep)
+                if key is None:
+                    missing.setdefault(name, []).append(dep)
+                elif key not in depends:
+                    depends.append(key)
+            self.packages[name]["depends"] = depends
+        return missing
+
+    def depends(self, name):
+        return [dep for dep in self.packages[name]["depends"] if dep in self.packages]
+
+    def closure(self, roots):
+        """All packages needed to load `roots`, including the roots."""
+        todo = [self.lookup(root) or root for root in roots]
+        seen = set()
+        while todo:
+            name = todo.pop()
+            if name in seen or name not in self.packages:
+                continue
+            seen.add(name)
+            todo.extend(self.depends(name))
+        return seen
+
+    def cycles(self, names=None):
+        """Return the strongly connected components with more than one package."""
+        names = sorted(self.packages if names is None else names)
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        result = []
+
+        def strongconnect(node):
+            # iterative Tarjan, the lock is deep enough to hit the recursion limit
+            work = [(node, iter(self.depends(node)))]
+            index[node] = low[node] = len(index)
+            stack.append(node)
+            on_stack.add(node)
+            while work:
+                v, children = work[-1]
+                for w in children:
+                    if w not in index:
+                        index[w] = low[w] = len(index)
+                        stack.append(w)
+                        on_stack.add(w)
+                        work.append((w, iter(self.depends(w))))
+                        break
+                    elif w in on_stack:
+                        low[v] = min(low[v], index[w])
+                else:
+                    work.pop()
+                    if work:
+                        low[work[-1][0]] = min(low[work[-1][0]], low[v])
+                    if low[v] == index[v]:
+                        component = []
+                        while True:
+                            w = stack.pop()
+                            on_stack.discard(w)
+                            component.append(w)
+                            if w == v:
+                                break
+                        if len(component) > 1:
+                            result.append(sorted(component))
+
+        for name in names:
+            if name not in index:
+                strongconnect(name)
+        return result
+
+    def load_waves(self, roots):
+        """
+        Layer the closure of `roots` so every package only depends on earlier waves.
+
+        The wheels of one wave can be fetched in parallel. Packages in a
+        dependency cycle are put into the same wave.
+        """
+        remaining = self.closure(roots)
+        component = {name: (name,) for name in remaining}
+        for cycle in self.cycles(remaining):
+            for name in cycle:
+                component[name] = tuple(cycle)
+
+        done = set()
+        waves = []
+        while remaining:
+            wave = sorted(
+                name for name in remaining
+                if all(
+                    dep in done or dep in component[name]
+                    for member in component[name]
+                    for dep in self.depends(member)
+                )
+            )
+            waves.append(wave)
+            done.update(wave)
+            remaining.difference_update(wave)
+        return waves
@@ -0,0 +1,229 @@
+import ast
+import hashlib
+import io
+import json
+import re
+import tempfile
+import zipfile
+from pathlib import Path
+from wheels import add_files_to_wheel, compile_source, file_sha256, pyc_arcname
+
+try:
+    from matplotlib import _afm, ft2font
+    from matplotlib.font_manager import FontManager, afmFontProperty, ttfFontProperty
+except ImportError:
+    FontManager = None
+
+try:
+    from fontTools import subset
+except ImportError:
+    subset = None
+
+DATA_PREFIX = "matplotlib/mpl-data/"
+FONT_EXTENSIONS = (".ttf", ".otf", ".afm")
+CJK_FONT_STEM = "cjk-subset"
+FONT_CACHE_MANIFEST_NAME = "font_cache.json"
+FONT_MANAGER_VERSION_PATTERN = re.compile(rb"^\s+__version__ = (\d+)", re.M)
+MPL_INIT_NAME = "matplotlib/__init__.py"
+# appended to matplotlib/__init__.py, runs before font_manager loads the cached list
+FONTLIST_HOOK = b"""
+
+# prebuilt font list, added by font_cache.add_font_cache of the JupyterLite build
+def _install_prebuilt_fontlist():
+    import shutil
+    for prebuilt in Path(get_data_path()).glob("fontlist-v*.json"):
+        cache = Path(get_cachedir(), prebuilt.name)
+        if not cache.exists():
+            try:
+                shutil.copyfile(prebuilt, cache)
+            except OSError:
+                pass
+
+
+_install_prebuilt_fontlist()
+del _install_prebuilt_fontlist
+"""
+# kana, CJK symbols and punctuation, and full width forms are always kept,
+# kanji only when they appear in the notebooks or the helper package
+CJK_RANGES = [(0x3000, 0x30FF), (0xFF00, 0xFFEF)]
+CJK_TEXT_START = 0x2E80
+
+
+def collect_cjk_text(folders):
+    """Return the CJK characters used by the notebooks and sources of `folders`."""
+    chars = {chr(code) for start, end in CJK_RANGES for code in range(start, end + 1)}
+    for folder in folders:
+        for path in Path(folder).rglob("*"):
+            if path.suffix not in (".ipynb", ".py", ".md") or ".ipynb_checkpoints" in path.parts:
+                continue
+            text = path.read_text(encoding="utf-8", errors="ignore")
+            chars.update(c for c in text if ord(c) >= CJK_TEXT_START)
+    return "".join(sorted(chars))
+
+
+def subset_font(font_path, text):
+    """
+    Subset a font to the glyphs of `text`.
+
+    Returns:
+        tuple: (bytes, suffix) of the subset font, ".otf" for CFF outlines.
+    """
+    options = subset.Options()
+    options.font_number = 0
+    font = subset.load_font(font_path, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=text)
+    subsetter.subset(font)
+    font.flavor = None
+    buffer = io.BytesIO()
+    subset.save_font(font, buffer, options)
+    return buffer.getvalue(), ".otf" if "CFF " in font else ".ttf"
+
+
+def font_manager_version(zf):
+    match = FONT_MANAGER_VERSION_PATTERN.search(zf.read("matplotlib/font_manager.py"))
+    return int(match.group(1))
+
+
+def font_entry_fields(zf):
+    """
+    Field names of the FontEntry dataclass of the matplotlib in the wheel,
+    which can differ from the matplotlib that builds the list: matplotlib
+    rejects a cached list with unknown fields and scans the fonts again.
+    """
+    tree = ast.parse(zf.read("matplotlib/font_manager.py"))
+    cls = next(node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == "FontEntry")
+    return [
+        node.target.id
+        for node in cls.body
+        if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name)
+    ]
+
+
+def build_fontlist(data_folder, version, fields=None):
+    """
+    Build the font list that matplotlib writes to its cache folder on the
+    first import, for the fonts below `data_folder/fonts`.
+
+    File names are stored relative to the data folder, which is how
+    matplotlib stores its own fonts, so the list is valid wherever the
+    wheel is installed. With `fields` the entries only keep these
+    FontEntry fields, see `font_entry_fields`.
+    """
+    fonts = sorted(
+        path
+        for path in (data_folder / "fonts").rglob("*")
+        if path.suffix.lower() in FONT_EXTENSIONS
+    )
+    afmlist, ttflist = [], []
+    for path in fonts:
+        if path.suffix.lower() == ".afm":
+            with open(path, "rb") as f:
+                entry = afmFontProperty(str(path), _afm.AFM(f))
+            afmlist.append(entry)
+        else:
+            ttflist.append(ttfFontProperty(ft2font.FT2Font(str(path))))
+
+    def encode(entry):
+        entry = vars(entry)
+        if fields is not None:
+            entry = {key: value for key, value in entry.items() if key in fields}
+        entry = dict(entry, __class__="FontEntry")
+        entry["fname"] = Path(entry["fname"]).relative_to(data_folder).as_posix()
+        return entry
+
+    return {
+        "_version": version,
+        "_FontManager__default_weight": "normal",
+        "default_size": None,
+        "defaultFamily": {"ttf": "DejaVu Sans", "afm": "Helvetica"},
+        "afmlist": [encode(entry) for entry in afmlist],
+        "ttflist": [encode(entry) for entry in ttflist],
+        "__class__": "FontManager",
+    }
+
+
+def add_fontlist_hook(zf, files):
+    """
+    Append FONTLIST_HOOK to matplotlib/__init__.py, so that `import matplotlib`
+    copies the prebuilt font list to the cache folder, whatever imports it
+    first. A precompiled module of the wheel is compiled again.
+    """
+    source = zf.read(MPL_INIT_NAME)
+    if FONTLIST_HOOK in source:
+        return
+    source += FONTLIST_HOOK
+    files[MPL_INIT_NAME] = source
+    pyc_name = pyc_arcname(MPL_INIT_NAME)
+    if pyc_name in zf.namelist():
+        files[pyc_name] = compile_source(source, MPL_INIT_NAME)
+
+
+def add_font_cache(wheel_path, cjk_font=None, text_folders=(), stats=None):
+    """
+    Add a prebuilt `fontlist-v*.json` and optionally a subset CJK font to
+    the matplotlib wheel, so that the first figure in a new browser session
+    does not build the font cache.
+
+    `import matplotlib` copies the font list to the matplotlib cache folder,
+    see `add_fontlist_hook`; `helper.matplotlib` only picks the CJK font.
+    The wheel is only rewritten when it or the CJK font changed since the
+    last run.
+    """
+    wheel_path = Path(wheel_path)
+    if FontManager is None:
+        print("⚠️ matplotlib is not installed, the font cache is not prebuilt")
+        return False
+    if cjk_font is not None and subset is None:
+        print("⚠️ fonttools is not installed, the CJK font is not bundled")
+        cjk_font = None
+
+    text = collect_cjk_text(text_folders) if cjk_font is not None else ""
+    key = {
+        "cjk_font_sha256": file_sha256(cjk_font) if cjk_font is not None else None,
+        "text_sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+    }
+    manifest_file = wheel_path.parent / FONT_CACHE_MANIFEST_NAME
+    manifest = {}
+    if manifest_file.exists():
+        with open(manifest_file, encoding="utf-8") as f:
+            manifest = json.load(f)
+    old = manifest.get(wheel_path.name, {})
+    if old.get("key") == key and old.get("sha256") == file_sha256(wheel_path):
+        if stats is not None:
+            stats.cache_hits += 1
+        return False
+
+    files = {}
+    with tempfile.TemporaryDirectory() as tmp, zipfile.ZipFile(wheel_path) as zf:
+        data_folder = Path(tmp) / "mpl-data"
+        for name in zf.namelist():
+            if name.startswith(DATA_PREFIX + "fonts/") and name.lower().endswith(FONT_EXTENSIONS):
+                path = data_folder / name[len(DATA_PREFIX) :]
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(zf.read(name))
+
+        if cjk_font is not None:
+            data, suffix = subset_font(cjk_font, text)
+            path = data_folder / "fonts" / "ttf" / f"{CJK_FONT_STEM}{suffix}"
+            path.write_bytes(data)
+            files[f"{DATA_PREFIX}fonts/ttf/{path.name}"] = data
+            print(f"subset {cjk_font}: {len(text)} characters, {len(data)} bytes")
+
+        version = font_manager_version(zf)
+        fontlist = build_fontlist(data_folder, version, font_entry_fields(zf))
+        files[f"{DATA_PREFIX}fontlist-v{version}.json"] = json.dumps(fontlist, indent=2).encode()
+        add_fontlist_hook(zf, files)
+
+    size_before = wheel_path.stat().st_size
+    add_files_to_wheel(wheel_path, files)
+    manifest[wheel_path.name] = {"key": key, "sha256": file_sha256(wheel_path)}
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+
+    if stats is not None:
+        stats.cache_misses += 1
+        stats.bytes_read += size_before
+        stats.bytes_written += wheel_path.stat().st_size
+    print(f"font cache: {len(fontlist['ttflist'])} ttf and {len(fontlist['afmlist'])} afm fonts in {wheel_path.name}")
+    return True
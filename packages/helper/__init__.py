@@ -0,0 +1,44 @@
+"""
+Helper modules for the notebooks.
+
+The submodules import heavy libraries such as polars, matplotlib or bokeh,
+so they are only imported on first access, e.g. `helper.polars` or
+`from helper import polars`.
+"""
+import importlib
+
+__all__ = [
+    "archive",
+    "bokeh",
+    "dot",
+    "html",
+    "inventory",
+    "jupyter",
+    "jupyterlite",
+    "magics",
+    "matplotlib",
+    "notebook",
+    "numpy",
+    "plot",
+    "plotly",
+    "polars",
+    "puzzle",
+    "python",
+    "sat",
+    "sympy",
+    "text_search",
+    "utils",
+    "z3",
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module(f".{name}", __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,212 @@
+"""
+Zip export of workspace folders, and delta snapshots that only contain the
+files added, changed or deleted since a previous snapshot.
+
+This module doesn't depend on Pyodide, so the archives can be applied to a
+local copy of the workspace:
+
+    python -m helper.archive apply <target folder> <delta1.zip> <delta2.zip> ...
+"""
+import hashlib
+import json
+import os
+import sys
+import zipfile
+from datetime import datetime, timezone
+from fnmatch import fnmatch
+
+CHUNK_SIZE = 1 << 20
+# formats that are already compressed are stored as they are
+STORED_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".whl", ".wasm", ".parquet", ".arrow",
+    ".zip", ".gz", ".br", ".bz2", ".xz", ".zst", ".npz", ".mp3", ".mp4", ".woff2",
+}
+SNAPSHOT_FOLDER = ".snapshots"
+DELTA_MANIFEST_NAME = "_delta.json"
+APPLIED_FILE_NAME = "applied.json"
+DEFAULT_EXCLUDE = [".ipynb_checkpoints", "__pycache__", SNAPSHOT_FOLDER]
+
+
+def iter_folder_files(folder_path, include=None, exclude=DEFAULT_EXCLUDE):
+    """
+    Yield (path, arcname) of the files below `folder_path`.
+
+    `include` and `exclude` are glob patterns matched against the archive
+    name; `exclude` also prunes folders by name.
+    """
+    for root, dirs, files in os.walk(folder_path):
+        dirs[:] = sorted(d for d in dirs if not any(fnmatch(d, pattern) for pattern in exclude))
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            arcname = os.path.relpath(file_path, start=folder_path).replace(os.sep, "/")
+            if include is not None and not any(fnmatch(arcname, pattern) for pattern in include):
+                continue
+            if any(fnmatch(arcname, pattern) or fnmatch(file, pattern) for pattern in exclude):
+                continue
+            yield file_path, arcname
+
+
+def write_files_zip(fileobj, files, extra=None, progress=None):
+    """
+    Write a zip archive of `files`, [(path, arcname), ...], to `fileobj`,
+    which doesn't need to be seekable, reading every file in chunks.
+
+    `extra` maps more archive names to bytes, and
+    `progress(done_bytes, total_bytes, arcname)` is called after each file.
+    """
+    total = sum(os.path.getsize(path) for path, _ in files)
+    done = 0
+    with zipfile.ZipFile(fileobj, "w") as zipf:
+        for file_path, arcname in files:
+            info = zipfile.ZipInfo.from_file(file_path, arcname)
+            stored = os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            force_zip64 = info.file_size > zipfile.ZIP64_LIMIT
+            with open(file_path, "rb") as src, zipf.open(info, "w", force_zip64=force_zip64) as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    dst.write(chunk)
+            done += info.file_size
+            if progress is not None:
+                progress(done, total, arcname)
+        for arcname, data in (extra or {}).items():
+            zipf.writestr(arcname, data, compress_type=zipfile.ZIP_DEFLATED)
+
+
+def write_folder_zip(fileobj, folder_path, include=None, exclude=DEFAULT_EXCLUDE, progress=None):
+    """Write a zip archive of a folder to `fileobj`, see `write_files_zip`."""
+    write_files_zip(fileobj, list(iter_folder_files(folder_path, include, exclude)), progress=progress)
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_folder(folder_path, previous=None, include=None, exclude=DEFAULT_EXCLUDE):
+    """
+    Return {arcname: [mtime_ns, size, sha256]} of the files of a folder.
+
+    Files whose mtime and size match `previous`, a result of an earlier
+    call, are not read again.
+    """
+    previous = previous or {}
+    files = {}
+    for file_path, arcname in iter_folder_files(folder_path, include, exclude):
+        st = os.stat(file_path)
+        old = previous.get(arcname)
+        if old is not None and old[0] == st.st_mtime_ns and old[1] == st.st_size:
+            files[arcname] = old
+        else:
+            files[arcname] = [st.st_mtime_ns, st.st_size, file_sha256(file_path)]
+    return files
+
+
+def snapshot_path(folder_path, name):
+    return os.path.join(folder_path, SNAPSHOT_FOLDER, f"{name}.json")
+
+
+def load_snapshot(folder_path, name):
+    with open(snapshot_path(folder_path, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def latest_snapshot(folder_path):
+    """Return the most recent snapshot of a folder, or None."""
+    snapshots = []
+    folder = os.path.join(folder_path, SNAPSHOT_FOLDER)
+    if os.path.isdir(folder):
+        for file in os.listdir(folder):
+            if file.endswith(".json") and file != APPLIED_FILE_NAME:
+                snapshots.append(load_snapshot(folder_path, file[:-5]))
+    return max(snapshots, key=lambda snapshot: snapshot["created"], default=None)
+
+
+def write_delta_zip(
+    fileobj, folder_path, since=None, name=None, include=None, exclude=DEFAULT_EXCLUDE, progress=None
+):
+    """
+    Write the files added or changed since snapshot `since` (all files when
+    None) to a zip archive, together with a `_delta.json` manifest that
+    also lists the deleted files, and save the current state as snapshot
+    `name` (a timestamp by default).
+
+    Returns:
+        dict: the delta manifest.
+    """
+    created = datetime.now(timezone.utc)
+    name = name or created.strftime("%Y%m%d-%H%M%S")
+    base = load_snapshot(folder_path, since) if since is not None else None
+    cache = base or latest_snapshot(folder_path)
+    files = hash_folder(folder_path, cache["files"] if cache else None, include, exclude)
+
+    old_files = base["files"] if base else {}
+    added = sorted(set(files) - set(old_files))
+    modified = sorted(
+        arcname for arcname in set(files) & set(old_files) if files[arcname][2] != old_files[arcname][2]
+    )
+    deleted = sorted(set(old_files) - set(files))
+    manifest = {
+        "base": since,
+        "snapshot": name,
+        "created": created.isoformat(),
+        "added": added,
+        "modified": modified,
+        "deleted": deleted,
+        "sha256": {arcname: files[arcname][2] for arcname in added + modified},
+    }
+    changed = [(os.path.join(folder_path, *arcname.split("/")), arcname) for arcname in added + modified]
+    extra = {DELTA_MANIFEST_NAME: json.dumps(manifest, indent=1)}
+    write_files_zip(fileobj, changed, extra, progress)
+
+    os.makedirs(os.path.join(folder_path, SNAPSHOT_FOLDER), exist_ok=True)
+    with open(snapshot_path(folder_path, name), "w", encoding="utf-8") as f:
+        json.dump({"name": name, "created": manifest["created"], "files": files}, f)
+    return manifest
+
+
+def apply_delta(archive_path, target_folder):
+    """
+    Apply a delta archive to a local copy of the workspace.
+
+    Deltas must be applied in order: the base snapshot of the archive has
+    to be the last one applied to `target_folder`.
+    """
+    applied_path = os.path.join(target_folder, SNAPSHOT_FOLDER, APPLIED_FILE_NAME)
+    applied = None
+    if os.path.exists(applied_path):
+        with open(applied_path, encoding="utf-8") as f:
+            applied = json.load(f)["snapshot"]
+
+    with zipfile.ZipFile(archive_path) as zipf:
+        manifest = json.loads(zipf.read(DELTA_MANIFEST_NAME))
+        if manifest["base"] is not None and manifest["base"] != applied:
+            raise ValueError(
+                f"{archive_path} is based on snapshot {manifest['base']!r}, "
+                f"but the last one applied to {target_folder} is {applied!r}"
+            )
+        for arcname in manifest["added"] + manifest["modified"]:
+            zipf.extract(arcname, target_folder)
+    for arcname in manifest["deleted"]:
+        path = os.path.join(target_folder, *arcname.split("/"))
+        if os.path.exists(path):
+            os.remove(path)
+
+    os.makedirs(os.path.dirname(applied_path), exist_ok=True)
+    with open(applied_path, "w", encoding="utf-8") as f:
+        json.dump({"snapshot": manifest["snapshot"]}, f)
+    return manifest
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "apply":
+        print(__doc__)
+        sys.exit(1)
+    for archive in sys.argv[3:]:
+        manifest = apply_delta(archive, sys.argv[2])
+        print(
+            f"{archive}: snapshot {manifest['snapshot']}, {len(manifest['added'])} added, "
+            f"{len(manifest['modified'])} modified, {len(manifest['deleted'])} deleted"
+        )
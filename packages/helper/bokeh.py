@@ -1,8 +1,9 @@
 from collections import deque
-from bokeh.core.has_props import HasProps
 
 
 def find_path(root, target, root_name="", all=False, depth=16):
+    from bokeh.core.has_props import HasProps
+
     todo = deque([(root, [])])
     visited = set()
     pathes = []
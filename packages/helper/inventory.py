@@ -0,0 +1,186 @@
+"""
+Inventory of a folder tree built with `os.scandir`, with per-directory
+sizes, filename glob and content grep.
+
+Directory listings are cached keyed on the directory mtime, which changes
+when entries are added, removed or renamed, so exploring a large extracted
+dataset again only scans the folders that changed. A file edited in place
+keeps its cached size until `refresh=True` is passed.
+
+Example
+-------
+
+```python
+from helper.inventory import Inventory
+inv = Inventory("data", max_depth=3)
+inv.print_tree(max_file_count=5)
+inv.glob("*.csv")
+list(inv.grep("NaN", "*.csv"))
+```
+"""
+import os
+import re
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+
+BINARY_CHECK_SIZE = 8192
+MAX_GREP_FILE_SIZE = 16 << 20
+
+
+@dataclass
+class DirListing:
+    mtime_ns: int
+    # [(name, size, mtime_ns)], sorted by name
+    files: list = field(default_factory=list)
+    dirs: list = field(default_factory=list)
+
+
+# {absolute directory path: DirListing}
+_listings = {}
+
+
+def scan_directory(path, refresh=False):
+    """Return the listing of one directory, from the cache when its mtime is unchanged."""
+    path = os.path.abspath(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    listing = _listings.get(path)
+    if listing is not None and listing.mtime_ns == mtime_ns and not refresh:
+        return listing
+
+    listing = DirListing(mtime_ns)
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    listing.dirs.append(entry.name)
+                elif entry.is_file():
+                    st = entry.stat()
+                    listing.files.append((entry.name, st.st_size, st.st_mtime_ns))
+            except OSError:
+                continue
+    listing.files.sort()
+    listing.dirs.sort()
+    _listings[path] = listing
+    return listing
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class Inventory:
+    """
+    The files below `root`, scanned breadth first.
+
+    Parameters:
+        max_depth: Deepest folder level scanned, None for no limit.
+        max_entries: Stop scanning after this many files and folders; the
+            inventory is then marked as `truncated`.
+        refresh: Scan every folder again instead of using the cache.
+    """
+
+    def __init__(self, root, max_depth=None, max_entries=None, refresh=False):
+        self.root = root
+        self.max_depth = max_depth
+        self.max_entries = max_entries
+        self.truncated = False
+        # {relative directory path: DirListing}, "" is the root
+        self.listings = {}
+        self.scan(refresh)
+        self.sizes = self.aggregate_sizes()
+
+    def scan(self, refresh):
+        todo = [("", 0)]
+        entries = 0
+        while todo:
+            next_todo = []
+            for rel_dir, depth in todo:
+                listing = scan_directory(os.path.join(self.root, rel_dir), refresh)
+                self.listings[rel_dir] = listing
+                entries += len(listing.files) + len(listing.dirs)
+                if self.max_entries is not None and entries >= self.max_entries:
+                    self.truncated = True
+                    return
+                if self.max_depth is not None and depth >= self.max_depth:
+                    self.truncated = self.truncated or bool(listing.dirs)
+                    continue
+                next_todo.extend((self.join(rel_dir, name), depth + 1) for name in listing.dirs)
+            todo = next_todo
+
+    @staticmethod
+    def join(rel_dir, name):
+        return f"{rel_dir}/{name}" if rel_dir else name
+
+    def aggregate_sizes(self):
+        """Return {relative directory path: (total bytes, file count)} of the scanned tree."""
+        sizes = {}
+        for rel_dir in sorted(self.listings, key=lambda path: -path.count("/") if path else 1):
+            listing = self.listings[rel_dir]
+            size = sum(item[1] for item in listing.files)
+            count = len(listing.files)
+            for name in listing.dirs:
+                sub_size, sub_count = sizes.get(self.join(rel_dir, name), (0, 0))
+                size += sub_size
+                count += sub_count
+            sizes[rel_dir] = (size, count)
+        return sizes
+
+    def iter_files(self):
+        """Yield (relative path, size, mtime_ns) of every scanned file."""
+        for rel_dir, listing in self.listings.items():
+            for name, size, mtime_ns in listing.files:
+                yield self.join(rel_dir, name), size, mtime_ns
+
+    def glob(self, pattern):
+        """Relative paths of the files matching `pattern`, by name or by path."""
+        return sorted(
+            path
+            for path, _, _ in self.iter_files()
+            if fnmatch(path, pattern) or fnmatch(path.rsplit("/", 1)[-1], pattern)
+        )
+
+    def grep(self, regex, pattern="*", max_matches=100, max_file_size=MAX_GREP_FILE_SIZE):
+        """
+        Yield (relative path, line number, line) of the lines matching
+        `regex` in the text files matching `pattern`.
+
+        Binary files and files larger than `max_file_size` are skipped.
+        """
+        regex = re.compile(regex)
+        found = 0
+        for path in self.glob(pattern):
+            full_path = os.path.join(self.root, path)
+            if os.path.getsize(full_path) > max_file_size:
+                continue
+            with open(full_path, "rb") as f:
+                if b"\0" in f.read(BINARY_CHECK_SIZE):
+                    continue
+            with open(full_path, encoding="utf-8", errors="replace") as f:
+                for lineno, line in enumerate(f, 1):
+                    if regex.search(line):
+                        yield path, lineno, line.rstrip("\n")
+                        found += 1
+                        if found >= max_matches:
+                            return
+
+    def print_tree(self, max_file_count=100, indent=0, rel_dir=""):
+        """Print the folders with their total size and at most `max_file_count` files each."""
+        listing = self.listings.get(rel_dir)
+        if listing is None:
+            return
+        prefix = " " * indent + "|-- "
+        for name in listing.dirs:
+            path = self.join(rel_dir, name)
+            if path in self.listings:
+                size, count = self.sizes[path]
+                print(f"{prefix}{name}/ ({format_size(size)}, {count} files)")
+                self.print_tree(max_file_count, indent + 4, path)
+            else:
+                print(f"{prefix}{name}/ (not scanned)")
+        for name, size, _ in listing.files[:max_file_count]:
+            print(f"{prefix}{name} ({format_size(size)})")
+        if len(listing.files) > max_file_count:
+            print(f"{prefix}... {len(listing.files) - max_file_count} more files")
@@ -1,5 +1,3 @@
-import os
-import zipfile
 import io
 import pyodide
 import js
@@ -7,36 +5,225 @@ import base64
 import mimetypes
 from urllib.parse import quote
 from IPython.display import display_html
+from .archive import (
+    CHUNK_SIZE,
+    DEFAULT_EXCLUDE,
+    STORED_EXTENSIONS,
+    iter_folder_files,
+    write_delta_zip,
+    write_folder_zip,
+)
 
+# {download file name: object URL of its latest archive}
+_object_urls = {}
 
-def zip_folder_bytes(folder_path="/files"):
+
+class JSChunkWriter(io.RawIOBase):
+    """
+    A write-only file that copies its data to JavaScript in chunks of
+    `chunk_size` bytes, so that the Python side never holds more than one
+    chunk.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self.flush_chunk()
+        return len(data)
+
+    def flush_chunk(self):
+        if self.buffer:
+            chunk = js.Uint8Array.new(len(self.buffer))
+            chunk.assign(self.buffer)
+            self.chunks.append(chunk)
+            self.size += len(self.buffer)
+            self.buffer = bytearray()
+
+    def close(self):
+        self.flush_chunk()
+        super().close()
+
+    def to_blob(self, mimetype="application/octet-stream"):
+        self.flush_chunk()
+        options = pyodide.ffi.to_js({"type": mimetype}, dict_converter=js.Object.fromEntries)
+        return js.Blob.new(pyodide.ffi.to_js(self.chunks), options)
+
+
+def revoke_object_url(filename, url=None):
+    """Release the archive of the download `filename`, only if it is still `url` when given."""
+    if filename in _object_urls and url in (None, _object_urls[filename]):
+        js.URL.revokeObjectURL(_object_urls.pop(filename))
+
+
+def revoke_object_urls():
+    """Release the archives of all previous downloads."""
+    for filename in list(_object_urls):
+        revoke_object_url(filename)
+
+
+def zip_folder_bytes(folder_path="/files", include=None, exclude=DEFAULT_EXCLUDE):
     zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w") as zipf:
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, start=folder_path)
-                zipf.write(file_path, arcname=arcname)
-    zip_buffer.seek(0)
+    write_folder_zip(zip_buffer, folder_path, include, exclude)
     return zip_buffer.getvalue()
 
 
-def download_folder(folder_path='.', filename="jupyterlite_files.zip"):
-    zip_bytes = zip_folder_bytes(folder_path)
-    
-    uint8 = pyodide.ffi.to_js(zip_bytes)
-    
-    blob = js.Blob.new([uint8], {"type": "application/zip"})
+def download_folder(
+    folder_path='.',
+    filename="jupyterlite_files.zip",
+    include=None,
+    exclude=DEFAULT_EXCLUDE,
+    progress=None,
+    revoke_after=600,
+    since=None,
+    snapshot=None,
+):
+    """
+    Show a link that downloads a folder as a zip archive.
+
+    The archive is written in chunks straight into JavaScript memory, so a
+    large folder doesn't need several copies of itself in the WASM heap.
+    The link of a previous download of the same `filename` is revoked,
+    and this one after `revoke_after` seconds, so links to other archives
+    keep working.
+
+    With `since` or `snapshot` the archive is a delta: it only holds the
+    files added or changed since snapshot `since` (all files without it)
+    and a `_delta.json` manifest, and the current state is saved as
+    snapshot `snapshot` (a timestamp by default) in `.snapshots`. Apply the
+    deltas in order with `python -m helper.archive apply <folder> <zip>...`.
+
+    Example
+    -------
+
+    ```python
+    download_folder("data", include=["*.csv"], progress=lambda done, total, name: print(name))
+    download_folder(snapshot="v1")
+    download_folder(since="v1", snapshot="v2", filename="changes_v2.zip")
+    ```
+    """
+    writer = JSChunkWriter()
+    if since is not None or snapshot is not None:
+        manifest = write_delta_zip(writer, folder_path, since, snapshot, include, exclude, progress)
+        print(
+            f"snapshot {manifest['snapshot']}: {len(manifest['added'])} added, "
+            f"{len(manifest['modified'])} modified, {len(manifest['deleted'])} deleted"
+        )
+    else:
+        write_folder_zip(writer, folder_path, include, exclude, progress)
+    blob = writer.to_blob("application/zip")
+    writer.chunks.clear()
+    revoke_object_url(filename)
     url = js.URL.createObjectURL(blob)
-    
+    _object_urls[filename] = url
+    if revoke_after is not None:
+        js.setTimeout(pyodide.ffi.create_once_callable(lambda: revoke_object_url(filename, url)), revoke_after * 1000)
+
     # create HTML link
     html = f'<a download="{filename}" href="{url}">Download {filename}</a>'
     display_html(html, raw=True)
 
 
+def get_site_url():
+    return str(js.location).split('/extensions')[0]
+
+
+async def preload_packages(notebook_path, site_url=None):
+    """
+    Load every package a notebook imports in one parallel batch.
+
+    The package lists are generated at build time into
+    `static/pyodide/preload.json`, keyed by the notebook path relative
+    to the content folder.
+
+    Example
+    -------
+
+    ```python
+    from helper.jupyterlite import preload_packages
+    await preload_packages("demo/plots/mandelbrot.ipynb")
+    ```
+    """
+    import pyodide_js
+    from pyodide.http import pyfetch
+
+    if site_url is None:
+        site_url = get_site_url()
+
+    resp = await pyfetch(f"{site_url}/static/pyodide/preload.json")
+    manifest = await resp.json()
+    names = manifest.get(notebook_path.lstrip("/"), [])
+    if names:
+        await pyodide_js.loadPackage(pyodide.ffi.to_js(names))
+    return names
+
+
+_search_cache = {}
+
+
+async def _fetch_search_json(site_url, name):
+    from pyodide.http import pyfetch
+
+    key = (site_url, name)
+    if key not in _search_cache:
+        resp = await pyfetch(f"{site_url}/api/search/{name}.json")
+        _search_cache[key] = await resp.json() if resp.ok else {}
+    return _search_cache[key]
+
+
+async def search(query, limit=20, site_url=None):
+    """
+    Search the markdown and code cells of all shipped notebooks.
+
+    Only the index shards of the query terms are downloaded, and they are
+    cached for later queries. Every term of the query must appear in a
+    notebook.
+
+    Example
+    -------
+
+    ```python
+    from helper.jupyterlite import search
+    await search("group_by_dynamic")
+    ```
+
+    Returns:
+        list: dicts with the notebook path, title, score and the indices
+        of the matching cells, best first.
+    """
+    import asyncio
+    from .text_search import rank, shard_name, tokenize
+
+    if site_url is None:
+        site_url = get_site_url()
+
+    terms = list(tokenize(query))
+    meta = await _fetch_search_json(site_url, "meta")
+    names = sorted({shard_name(term) for term in terms} & set(meta.get("shards", [])))
+    shards = await asyncio.gather(*[_fetch_search_json(site_url, name) for name in names])
+    postings = {}
+    for shard in shards:
+        postings.update((term, shard[term]) for term in terms if term in shard)
+
+    docs = meta.get("docs", [])
+    results = []
+    for doc, score, cells in rank(terms, postings, len(docs), limit):
+        path, title = docs[doc]
+        results.append({"path": path, "title": title, "score": round(score, 3), "cells": cells})
+    return results
+
+
 def file_to_data_url(path: str, site_url=None) -> str:
     if site_url is None:
-        site_url = str(js.location).split('/extensions')[0]
+        site_url = get_site_url()
 
     mime_type, _ = mimetypes.guess_type(path)
     if not mime_type:
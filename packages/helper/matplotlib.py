@@ -1,13 +1,39 @@
-import numpy as np
-import matplotlib.pyplot as plt
+import sys
 from functools import wraps
-import numpy as np
 import matplotlib as mpl
 
+CJK_FONT_STEM = "cjk-subset"
 
-plt.rcParams['font.family'] = "MS Gothic"
+
+def find_cjk_family():
+    """
+    Family name of the CJK font bundled with the matplotlib wheel, or None.
+
+    The prebuilt font list itself is installed by `import matplotlib`.
+    """
+    import json
+    from pathlib import Path
+
+    for prebuilt in Path(mpl.get_data_path()).glob("fontlist-v*.json"):
+        with open(prebuilt, encoding="utf-8") as f:
+            for entry in json.load(f)["ttflist"]:
+                if Path(entry["fname"]).stem == CJK_FONT_STEM:
+                    return entry["name"]
+    return None
+
+
+# only stored here, the font is looked up when the first figure is drawn
+if sys.platform == "emscripten":
+    CJK_FAMILY = find_cjk_family()
+    if CJK_FAMILY is not None:
+        # latin glyphs from DejaVu Sans, japanese ones from the bundled subset
+        mpl.rcParams['font.family'] = ["DejaVu Sans", CJK_FAMILY]
+else:
+    CJK_FAMILY = None
+    mpl.rcParams['font.family'] = "MS Gothic"
 
 def draw_grid(ax, grid, size=6, margin=0.02, fontsize=16):
+    import numpy as np
     from matplotlib import pyplot as plt
     cols = len(grid[0])
     rows = len(grid)
@@ -53,6 +79,9 @@ def drawfunc(func):
 
 class ImageDrawer:
     def __init__(self, arr, reverse=True):
+        # the drawing methods use these through `mpl`
+        import matplotlib.collections, matplotlib.image, matplotlib.lines
+        import matplotlib.markers, matplotlib.patches, matplotlib.text
         from matplotlib.transforms import Affine2D, IdentityTransform
         from matplotlib.backends.backend_agg import RendererAgg
 
@@ -78,6 +107,7 @@ class ImageDrawer:
         self.parameters = kw
             
     def to_array(self):
+        import numpy as np
         buf = self.renderer.buffer_rgba()
         arr = np.frombuffer(buf, np.uint8)
         arr.shape = self.height, self.width, -1
@@ -2,18 +2,106 @@ from io import StringIO
 import json
 from datetime import datetime, timedelta
 import random
+import time
 from typing import Any
 import numbers
 from dataclasses import dataclass
-from collections import ChainMap
+from collections import ChainMap, OrderedDict
 from functools import cache
-import pyarrow as pa
-import numpy as np
 import polars as pl
 from polars.exceptions import InvalidOperationError
-from IPython.display import display_html, display_markdown, display_pretty
 from helper.python import keydefaultdict
 
+CAPTURE_MODES = ("full", "schema", "head", "sample", "stats", "plan")
+
+
+def estimated_size(obj):
+    """Estimated bytes held by a captured value."""
+    if isinstance(obj, (pl.DataFrame, pl.Series)):
+        return obj.estimated_size()
+    if isinstance(obj, (list, tuple)):
+        return sum(estimated_size(item) for item in obj)
+    if isinstance(obj, dict):
+        return sum(estimated_size(item) for item in obj.values())
+    if isinstance(obj, str):
+        return len(obj)
+    return 0
+
+
+def detach(obj):
+    """
+    Copy a small frame or series out of the buffers of a large one.
+
+    Slices such as `head()` share the buffers of their source, so keeping
+    them would keep the whole source alive.
+    """
+    if isinstance(obj, pl.Series):
+        return pl.Series(obj.name, obj.to_list(), dtype=obj.dtype)
+    return pl.DataFrame(obj.rows(), schema=obj.schema, orient="row")
+
+
+class CaptureStore:
+    """
+    Captured values by name that evicts the least recently used ones when
+    their total estimated size exceeds `budget` bytes.
+
+    `on_evict(name)` is called for every evicted value, so that an owner
+    that keeps building the value (see `ExprCapturer`) can let go of it too.
+    """
+
+    def __init__(self, budget=None, on_evict=None):
+        self.budget = budget
+        self.on_evict = on_evict
+        self.values = OrderedDict()
+        self.sizes = {}
+        self.evicted = set()
+
+    def __contains__(self, name):
+        return name in self.values
+
+    def get(self, name):
+        self.values.move_to_end(name)
+        return self.values[name]
+
+    def put(self, name, value):
+        self.values[name] = value
+        self.values.move_to_end(name)
+        self.sizes[name] = estimated_size(value)
+        self.evicted.discard(name)
+        if self.budget is None:
+            return
+        while self.values and sum(self.sizes.values()) > self.budget:
+            old_name, _ = self.values.popitem(last=False)
+            del self.sizes[old_name]
+            self.evicted.add(old_name)
+            if self.on_evict is not None:
+                self.on_evict(old_name)
+
+    @property
+    def total_size(self):
+        return sum(self.sizes.values())
+
+
+def capture_frame(obj, mode, n=5, seed=0):
+    """Reduce a DataFrame or LazyFrame to what the capture mode keeps."""
+    if isinstance(obj, pl.LazyFrame):
+        # a lazy frame is only a plan, collecting it here would run the pipeline twice
+        return obj if mode == "full" else obj.explain()
+    if mode == "full" or not isinstance(obj, pl.DataFrame):
+        return obj
+    if mode in ("schema", "plan"):
+        return obj.schema
+    if mode == "head":
+        if obj.height <= 2 * n:
+            return detach(obj)
+        return detach(pl.concat([obj.head(n), obj.tail(n)]))
+    if mode == "sample":
+        return detach(obj.sample(min(n, obj.height), seed=seed))
+    if mode == "stats":
+        return obj.describe()
+    raise ValueError(f"unknown capture mode {mode!r}, use one of {CAPTURE_MODES}")
+
+
 class DataCapturer:
     """
     A utility class for capturing and logging DataFrames during method chaining in data pipelines.
@@ -22,6 +110,17 @@ class DataCapturer:
     DataFrames associated with method names dynamically. It enables debugging and 
     analyzing the state of data at various stages of the pipeline.
 
+    Parameters:
+        mode: What is kept of every captured frame, "full" (the frame
+            itself), "schema", "head" (first and last `n` rows), "sample"
+            (`n` random rows), "stats" (`describe()`) or "plan" (the
+            schema, or the plan of a LazyFrame).
+        budget: Total estimated bytes of the captured values; the least
+            recently used ones are dropped beyond it.
+
+    The wall time since the previous capture and the row count of every
+    capture are available with `cap.report()`.
+
     Example
     -------
 
@@ -50,44 +149,182 @@ class DataCapturer:
     ```
     """
 
-    def __init__(self):
+    def __init__(self, mode="full", n=5, budget=None, seed=0):
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"unknown capture mode {mode!r}, use one of {CAPTURE_MODES}")
         self._current_name = None  # Tracks the name of the current method being logged
-        self._logs = {}            # Stores logged data by method name
+        self._logs = CaptureStore(budget)  # Stores logged data by method name
+        self._stats = {}
+        self._mode = mode
+        self._n = n
+        self._seed = seed
+        self._last_time = time.perf_counter()
 
     def __getattr__(self, name):
         # Return logged data if the name exists in the logs, otherwise set the current name for logging
+        if name.startswith("__"):
+            raise AttributeError(name)
         if name in self._logs:
-            return self._logs[name]
+            return self._logs.get(name)
         else:
             self._current_name = name
             return self
 
     def __call__(self, df):
         # Log the DataFrame under the current method name and return it for method chaining
-        self._logs[self._current_name] = df
+        now = time.perf_counter()
+        self._stats[self._current_name] = {
+            "seconds": now - self._last_time,
+            "rows": df.height if isinstance(df, pl.DataFrame) else None,
+            "estimated_bytes": estimated_size(df),
+        }
+        self._logs.put(self._current_name, capture_frame(df, self._mode, self._n, self._seed))
+        self._last_time = time.perf_counter()
         return df
-    
+
+    def report(self):
+        """Per capture wall time since the previous one, rows, bytes and whether it is kept."""
+        return pl.DataFrame(
+            [
+                dict(name=name, kept=name in self._logs, **stats)
+                for name, stats in self._stats.items()
+            ],
+            schema={
+                "name": pl.String,
+                "kept": pl.Boolean,
+                "seconds": pl.Float64,
+                "rows": pl.Int64,
+                "estimated_bytes": pl.Int64,
+            },
+        )
+
+
+class BatchCapture:
+    """What an ExprCapturer keeps of the batches passed to one name."""
+
+    def __init__(self, mode, n, seed):
+        self.mode = mode
+        self.n = n
+        self.rng = random.Random(seed)
+        self.batches = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.first_time = None
+        self.reset()
+
+    def reset(self):
+        """Drop the kept value, the counts go on."""
+        self.value = [] if self.mode == "full" else None
+        self.keys = []
+
+    def add(self, s):
+        now = time.perf_counter()
+        if self.first_time is None:
+            self.first_time = now
+        self.seconds = now - self.first_time
+        self.batches += 1
+        self.rows += len(s)
+        mode = self.mode
+        if mode == "full":
+            self.value.append(s)
+        elif mode == "schema":
+            self.value = {"name": s.name, "dtype": s.dtype, "len": self.rows}
+        elif mode == "plan":
+            self.value = {"batches": self.batches, "rows": self.rows}
+        elif mode == "head":
+            if self.value is None:
+                self.value = detach(s.head(self.n))
+            elif len(self.value) < self.n:
+                self.value = detach(pl.concat([self.value, s.head(self.n - len(self.value))]))
+        elif mode == "sample":
+            self.add_sample(s)
+        elif mode == "stats":
+            self.add_stats(s)
+        else:
+            raise ValueError(f"unknown capture mode {mode!r}, use one of {CAPTURE_MODES}")
+
+    def add_sample(self, s):
+        # a uniform sample of all rows seen: the n rows with the smallest random keys
+        keys = [self.rng.random() for _ in range(len(s))]
+        items = list(zip(self.keys, self.value.to_list() if self.value is not None else []))
+        items += zip(keys, s.to_list())
+        items = sorted(items, key=lambda item: item[0])[: self.n]
+        self.keys = [key for key, _ in items]
+        self.value = pl.Series(s.name, [value for _, value in items], dtype=s.dtype)
+
+    def add_stats(self, s):
+        stats = self.value or {"count": 0, "null_count": 0, "min": None, "max": None}
+        stats["count"] += len(s)
+        stats["null_count"] += s.null_count()
+        if s.dtype.is_numeric() or s.dtype.is_temporal():
+            low, high = s.min(), s.max()
+            if low is not None:
+                stats["min"] = low if stats["min"] is None else min(stats["min"], low)
+                stats["max"] = high if stats["max"] is None else max(stats["max"], high)
+        self.value = stats
+
 
 class ExprCapturer:
-    def __init__(self):
+    """
+    Capture the batches an expression sees, `pl.col("A").pipe(cap.a)`.
+
+    `mode`, `n`, `budget` and `seed` work like in `DataCapturer`, and
+    "sample" keeps a uniform sample of all rows across batches.
+    """
+
+    def __init__(self, mode="full", n=5, budget=None, seed=0):
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"unknown capture mode {mode!r}, use one of {CAPTURE_MODES}")
         self._current_name = None
-        self._logs = {}            
+        # an evicted value is dropped by its capture too, the next batch starts a new one
+        self._logs = CaptureStore(budget, on_evict=lambda name: self._captures[name].reset())
+        self._captures = {}
+        self._mode = mode
+        self._n = n
+        self._seed = seed
 
     def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
         if name in self._logs:
-            return self._logs[name]
+            return self._logs.get(name)
         else:
             self._current_name = name
-            if self._current_name not in self._logs:
-                self._logs[self._current_name] = []
+            if self._current_name not in self._captures:
+                self._captures[name] = BatchCapture(self._mode, self._n, self._seed)
             return self
 
-    def _log_data(self, data):
-        self._logs[self._current_name].append(data)
+    def _log_data(self, data, name):
+        capture = self._captures[name]
+        capture.add(data)
+        self._logs.put(name, capture.value)
         return data
 
     def __call__(self, expr):
-        return expr.map_batches(self._log_data)
+        name = self._current_name
+        return expr.map_batches(lambda data: self._log_data(data, name))
+
+    def report(self):
+        """Per name batches, rows, wall time between the first and last batch and whether it is kept."""
+        return pl.DataFrame(
+            [
+                dict(
+                    name=name,
+                    kept=name in self._logs,
+                    batches=capture.batches,
+                    rows=capture.rows,
+                    seconds=capture.seconds,
+                )
+                for name, capture in self._captures.items()
+            ],
+            schema={
+                "name": pl.String,
+                "kept": pl.Boolean,
+                "batches": pl.Int64,
+                "rows": pl.Int64,
+                "seconds": pl.Float64,
+            },
+        )
 
 
 markdown_css = """
@@ -97,6 +334,22 @@ code {
 """
 
 
+def frame_rows(obj):
+    """Row count of a DataFrame or Series, None for other objects."""
+    if isinstance(obj, (pl.DataFrame, pl.Series)):
+        return len(obj)
+    return None
+
+
+def html_pane(data):
+    import panel as pn
+    try:
+        html = data._repr_html_()
+        return pn.pane.HTML(html)
+    except AttributeError:
+        return pn.pane.HTML(f"<pre>{data}</pre>")
+
+
 @dataclass
 class MethodCall:
     method: str
@@ -104,15 +357,15 @@ class MethodCall:
     kw: dict
     input: Any
     output: Any
+    seconds: float = None
+    rows_in: int = None
+    rows_out: int = None
+    estimated_bytes: int = None
+    # per node timings of LazyFrame.profile(), when collect() was profiled
+    nodes: pl.DataFrame = None
 
     def to_panel(self):
         import panel as pn
-        def make_pane(data):
-            try:
-                html = data._repr_html_()
-                return pn.pane.HTML(html)
-            except AttributeError:
-                return pn.pane.HTML(f"<pre>{data}</pre>")
 
         args = "\n".join([f"* `{str(arg)}`" for arg in self.args])
         kws = "\n".join([f"* {name}=`{str(value)}`" for name, value in self.kw.items()])
@@ -126,17 +379,37 @@ class MethodCall:
 ### kws
 {kws}
         """.strip()
+        if self.seconds is not None:
+            method += f"""
+
+### profile
+* time: `{self.seconds * 1000:.2f} ms`
+* rows: `{self.rows_in}` -> `{self.rows_out}`
+* estimated bytes: `{self.estimated_bytes}`"""
         args_pane = pn.pane.Markdown(method, stylesheets=[markdown_css])
-        input_pane = make_pane(self.input)
-        output_pane = make_pane(self.output)
+        input_pane = html_pane(self.input)
+        output_pane = html_pane(self.output)
 
-        return pn.Column(args_pane, pn.Row(input_pane, output_pane))
+        column = pn.Column(args_pane, pn.Row(input_pane, output_pane))
+        if self.nodes is not None:
+            column.append(html_pane(self.nodes))
+        return column
 
 
 class PipeLogger:
-    def __init__(self, obj):
+    """
+    Record every call of a method chain, `PipeLogger(df).filter(...).sort(...)`,
+    and show the input and output of each step in panel tabs.
+
+    With `profile=True` the wall time, rows in and out and estimated bytes
+    of every step are recorded too, see `report()`, and `collect()` of a
+    LazyFrame runs `LazyFrame.profile()` to get the time of every plan node.
+    """
+
+    def __init__(self, obj, profile=False):
         self.__current_obj = obj
         self.__history = [obj]
+        self.__profile = profile
 
     def __getattr__(self, name):
         if name.startswith("_ipython") or name.startswith("_repr"):
@@ -149,22 +422,41 @@ class PipeLogger:
     def __call__(self, *args, **kw):
         import types
 
-        obj = self.__current_obj(*args, **kw)
-        self.__history.append(obj)
-        self.__current_obj = obj
-
-        input, method, output = self.__history[-3:]
-
+        method = self.__current_obj
+        input = self.__history[-2]
         if isinstance(input, MethodCall):
             input = input.output
 
-        del self.__history[-2:]
         if isinstance(method, types.MethodType):
             method_name = method.__func__.__name__
         else:
             method_name = method.__name__
 
-        mc = MethodCall(method=method_name, input=input, output=output, args=args, kw=kw)
+        nodes = None
+        start = time.perf_counter()
+        if (
+            self.__profile
+            and method_name == "collect"
+            and isinstance(input, pl.LazyFrame)
+            and not args
+            and not kw
+            and hasattr(input, "profile")
+        ):
+            obj, nodes = input.profile()
+        else:
+            obj = method(*args, **kw)
+        seconds = time.perf_counter() - start
+        self.__current_obj = obj
+
+        del self.__history[-1]
+        mc = MethodCall(method=method_name, input=input, output=obj, args=args, kw=kw)
+        if self.__profile:
+            mc.seconds = seconds
+            mc.rows_in = frame_rows(input)
+            mc.rows_out = frame_rows(obj)
+            mc.estimated_bytes = estimated_size(obj)
+            if nodes is not None:
+                mc.nodes = nodes.with_columns(duration_us=pl.col("end") - pl.col("start"))
         self.__history.append(mc)
         return self
 
@@ -179,47 +471,233 @@ class PipeLogger:
             self._tab = self.create_tab()
         return self._tab._repr_mimebundle_(**kwargs)
 
+    def method_calls(self):
+        return [obj for obj in self.__history if isinstance(obj, MethodCall)]
+
+    def report(self, nodes=False):
+        """
+        Per step wall time, its share of the total, rows in and out and
+        estimated bytes of the output, recorded with `profile=True`.
+
+        With `nodes=True`, the plan node timings of the profiled `collect()`
+        calls instead, slowest first.
+        """
+        calls = self.method_calls()
+        if nodes:
+            frames = [
+                mc.nodes.with_columns(step=pl.lit(i, pl.Int64))
+                for i, mc in enumerate(calls)
+                if mc.nodes is not None
+            ]
+            if not frames:
+                return pl.DataFrame(schema={"node": pl.String, "duration_us": pl.UInt64})
+            return pl.concat(frames).sort("duration_us", descending=True)
+
+        df = pl.DataFrame(
+            [
+                {
+                    "step": i,
+                    "method": mc.method,
+                    "seconds": mc.seconds,
+                    "rows_in": mc.rows_in,
+                    "rows_out": mc.rows_out,
+                    "estimated_bytes": mc.estimated_bytes,
+                }
+                for i, mc in enumerate(calls)
+            ],
+            schema={
+                "step": pl.Int64,
+                "method": pl.String,
+                "seconds": pl.Float64,
+                "rows_in": pl.Int64,
+                "rows_out": pl.Int64,
+                "estimated_bytes": pl.Int64,
+            },
+        )
+        return df.with_columns(share=pl.col("seconds") / pl.col("seconds").sum())
+
     def create_tab(self):
+        """
+        Tabs of the steps, a tab is only rendered when it is first selected,
+        so the HTML of large intermediate frames is not built up front.
+        """
         import panel as pn
-        children = []
+        builders = []
         titles = []
-        for obj in self.__history:
-            if isinstance(obj, MethodCall):
-                children.append(obj.to_panel())
-                titles.append(obj.method)
-        return pn.Tabs(*zip(titles, children))
+        if self.__profile:
+            builders.append(lambda: html_pane(self.report()))
+            titles.append("profile")
+        for mc in self.method_calls():
+            builders.append(mc.to_panel)
+            titles.append(mc.method)
 
+        children = [pn.Column() for _ in builders]
+        tabs = pn.Tabs(*zip(titles, children))
 
-def list_eval(df: pl.DataFrame, *exprs, **named_exprs):
+        def render(index):
+            if 0 <= index < len(children) and not children[index].objects:
+                children[index].append(builders[index]())
+
+        render(tabs.active)
+        tabs.param.watch(lambda event: render(event.new), "active")
+        return tabs
+
+
+LIST_EVAL_ROW_INDEX = "_row_nr_"
+LIST_EVAL_ROW_LENGTH = "_row_len_"
+
+
+@cache
+def explode_keeps_empty_lists():
+    """Arguments of `LazyFrame.explode` that give one row per empty list, like polars < 2.0 did."""
+    import inspect
+    if "empty_as_null" in inspect.signature(pl.LazyFrame.explode).parameters:
+        return {"empty_as_null": True}
+    return {}
+
+
+def list_eval_regroup(lf, exprs):
+    """
+    Evaluate `exprs` over the exploded list columns, grouped back by row,
+    with the results `list.eval` gives: an empty list is evaluated as an
+    empty group and a null list gives null.
+
+    After `explode` the row index is a run of equal values per row, whose
+    boundaries are the cumulative sums of the list lengths. It is flagged
+    as sorted, so the group by slices these runs instead of hashing every
+    element. `explode` leaves one null row for an empty or null list, so
+    the columns are filtered by the list length of the row inside the
+    groups, and the results of null lists are set to null afterwards.
+    """
+    schema = lf.collect_schema()
     names = set()
     for expr in exprs:
         names.update(expr.meta.root_names())
-    for expr in named_exprs.values():
-        names.update(expr.meta.root_names())
+    list_names = sorted(name for name in names if isinstance(schema.get(name), pl.List))
+    if not list_names:
+        list_names = sorted(names)
+        row_length = pl.lit(1, dtype=pl.UInt32)
+    else:
+        lengths = [pl.col(name).list.len() for name in list_names]
+        row_length = (
+            pl.when(pl.any_horizontal([length.is_null() for length in lengths]))
+            .then(None)
+            .otherwise(lengths[0])
+        )
 
-    row_nr = "_row_nr_"
+    keep = pl.col(LIST_EVAL_ROW_LENGTH) > 0
+    masked_exprs = [
+        expression_replace(expr, {name: pl.col(name).filter(keep) for name in names})
+        for expr in exprs
+    ]
 
-    is_lazy = isinstance(df, pl.LazyFrame)
+    def group(lf):
+        return (
+            lf
+            .with_row_index(name=LIST_EVAL_ROW_INDEX)
+            .with_columns(row_length.alias(LIST_EVAL_ROW_LENGTH))
+            .explode(list_names, **explode_keeps_empty_lists())
+            .with_columns(pl.col(LIST_EVAL_ROW_INDEX).set_sorted())
+            .group_by(LIST_EVAL_ROW_INDEX, maintain_order=True)
+            .agg(*masked_exprs, pl.col(LIST_EVAL_ROW_LENGTH).first())
+            .drop(LIST_EVAL_ROW_INDEX)
+        )
 
-    res = (
-        df.lazy()
-        .with_row_count(name=row_nr)
-        .explode(list(names))
-        .group_by(row_nr, maintain_order=True)
-        .agg(*exprs, **named_exprs)
-        .drop(row_nr)
+    # the cast gives the planner the real dtypes, see `list_eval_probe`
+    output_schema = group(list_eval_probe(schema)).collect().schema
+    return group(lf).select(
+        pl.when(pl.col(LIST_EVAL_ROW_LENGTH).is_not_null())
+        .then(pl.col(name).cast(dtype))
+        .alias(name)
+        for name, dtype in output_schema.items()
+        if name != LIST_EVAL_ROW_LENGTH
     )
 
+
+def list_eval_probe(schema):
+    """
+    One row frame of `schema` with lists of two nulls. The dtypes of an
+    expression evaluated on it are reliable, while `collect_schema()` of a
+    group by doesn't always tell aggregations from elementwise expressions.
+    """
+    return pl.DataFrame(
+        [
+            pl.Series(name, [[None, None]] if isinstance(dtype, pl.List) else [None], dtype=dtype)
+            for name, dtype in schema.items()
+        ]
+    ).lazy()
+
+
+def list_eval_native(probe, schema, expr, dtype):
+    """
+    Rewrite an expression of one list column to `list.eval` over `pl.element()`,
+    or return None when it doesn't give the same dtype as the regroup.
+    """
+    names = expr.meta.root_names()
+    if len(names) != 1 or not isinstance(schema.get(names[0]), pl.List):
+        return None
+    name = names[0]
+    output_name = expr.meta.output_name()
+    try:
+        native = pl.col(name).list.eval(expression_replace(expr, {name: pl.element()}))
+        if not isinstance(dtype, pl.List):
+            # aggregations give a list of one value in list.eval
+            native = native.list.first()
+        native = native.alias(output_name)
+        if probe.select(native).collect().schema[output_name] != dtype:
+            return None
+    except (pl.exceptions.PolarsError, ValueError, TypeError):
+        return None
+    return native
+
+
+def list_eval(df: pl.DataFrame, *exprs, **named_exprs):
+    """
+    Evaluate expressions over the elements of list columns, one result per row.
+
+    Expressions that only use one list column run as `list.eval` on
+    `pl.element()`; the others explode the list columns they use and
+    group the results back by row. Both give the `list.eval` results: an
+    expression over an empty list sees no rows (an empty list or e.g. a sum
+    of 0), and a null list gives null.
+    """
+    exprs = [*exprs, *(expr.alias(name) for name, expr in named_exprs.items())]
+    is_lazy = isinstance(df, pl.LazyFrame)
+    lf = df.lazy()
+
+    schema = lf.collect_schema()
+    probe = list_eval_probe(schema)
+    try:
+        regroup_schema = list_eval_regroup(probe, exprs).collect().schema
+    except (pl.exceptions.PolarsError, ValueError, TypeError):
+        regroup_schema = None
+    native_exprs = []
+    regroup_exprs = []
+    for i, expr in enumerate(exprs):
+        native = None
+        if regroup_schema is not None:
+            native = list_eval_native(probe, schema, expr, regroup_schema.dtypes()[i])
+        if native is None:
+            regroup_exprs.append(expr)
+        else:
+            native_exprs.append(native)
+
+    frames = []
+    if native_exprs:
+        frames.append(lf.select(native_exprs))
+    if regroup_exprs:
+        frames.append(list_eval_regroup(lf, regroup_exprs))
+    if len(frames) == 1:
+        res = frames[0]
+    else:
+        res = pl.concat(frames, how="horizontal").select(regroup_schema.names())
+
     if is_lazy:
         return res
     else:
         return res.collect()
 
 
-pl.DataFrame.list_eval = list_eval
-pl.LazyFrame.list_eval = list_eval
-
-
 def try_cast_to_number(s, int_type=pl.Int64, float_type=pl.Float64):
     try:
         return s.str.strip_chars().cast(int_type)
@@ -229,23 +707,352 @@ def try_cast_to_number(s, int_type=pl.Int64, float_type=pl.Float64):
         except InvalidOperationError:
             return s
 
+# (kind, regex of the stripped text), checked in order, the first kind all values match wins
+STRING_TYPE_PATTERNS = [
+    ("int", r"^[+-]?\d+$"),
+    ("float", r"^[+-]?((\d+\.?\d*|\.\d+)([eE][+-]?\d+)?|(?i:nan|inf|infinity))$"),
+    ("bool", r"^(?i:true|false)$"),
+    ("date", r"^\d{4}-\d{1,2}-\d{1,2}$"),
+    ("datetime", r"^\d{4}-\d{1,2}-\d{1,2}[T ]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?$"),
+]
+
+
+def infer_string_types(
+    df,
+    sample_rows=1000,
+    categorical_ratio=0.05,
+    strip=True,
+    int_type=pl.Int64,
+    float_type=pl.Float64,
+    seed=0,
+):
+    """
+    Classify the string columns of a DataFrame or LazyFrame from a sample
+    of rows, in one pass over the sample.
+
+    A column whose non empty values all match a pattern of
+    `STRING_TYPE_PATTERNS` gets its type, a column with at most
+    `categorical_ratio` distinct values per value is Categorical, and the
+    other columns stay String.
+
+    Parameters:
+        sample_rows: Rows classified, a random sample of a DataFrame and
+            the first rows of a LazyFrame; None for all rows.
+        strip: Match the values with surrounding whitespace removed.
+
+    Returns:
+        dict: {column: dtype} of the string columns that are not String.
+    """
+    columns = [name for name, dtype in df.collect_schema().items() if dtype == pl.String]
+    if not columns:
+        return {}
+    sample = df.select(columns)
+    if isinstance(sample, pl.LazyFrame):
+        sample = sample.head(sample_rows).collect() if sample_rows is not None else sample.collect()
+    elif sample_rows is not None and sample.height > sample_rows:
+        sample = sample.sample(sample_rows, seed=seed)
+
+    counts = []
+    for name in columns:
+        s = pl.col(name).str.strip_chars() if strip else pl.col(name)
+        valid = s.is_not_null() & (s != "")
+        counts.append(valid.sum().alias(f"{name}\0n"))
+        counts.append(s.filter(valid).n_unique().alias(f"{name}\0unique"))
+        for kind, pattern in STRING_TYPE_PATTERNS:
+            counts.append(s.str.contains(pattern).sum().alias(f"{name}\0{kind}"))
+    row = sample.select(counts).row(0, named=True)
+
+    dtypes = {
+        "int": int_type,
+        "float": float_type,
+        "bool": pl.Boolean,
+        "date": pl.Date,
+        "datetime": pl.Datetime,
+    }
+    schema = {}
+    for name in columns:
+        n = row[f"{name}\0n"]
+        if n == 0:
+            continue
+        for kind, _ in STRING_TYPE_PATTERNS:
+            if row[f"{name}\0{kind}"] == n:
+                schema[name] = dtypes[kind]
+                break
+        else:
+            if categorical_ratio is not None and row[f"{name}\0unique"] <= categorical_ratio * n:
+                schema[name] = pl.Categorical
+    return schema
+
+
+def cast_string_expr(name, dtype, strip=True):
+    """Expression converting a string column to a dtype of `infer_string_types`, unparsable values become null."""
+    s = pl.col(name).str.strip_chars() if strip else pl.col(name)
+    if dtype == pl.Boolean:
+        lower = s.str.to_lowercase()
+        return pl.when(lower == "true").then(True).when(lower == "false").then(False).alias(name)
+    if dtype == pl.Date:
+        return s.str.to_date("%Y-%m-%d", strict=False).alias(name)
+    if dtype == pl.Datetime:
+        return s.str.replace(" ", "T", literal=True).str.to_datetime(strict=False).alias(name)
+    return s.cast(dtype, strict=False).alias(name)
+
+
+def lossy_casts(df, schema, strip=True):
+    """
+    Columns of `schema` whose cast turns non empty values into null,
+    checked over all rows in one pass.
+    """
+    if not schema:
+        return []
+    checks = []
+    for name, dtype in schema.items():
+        s = pl.col(name).str.strip_chars() if strip else pl.col(name)
+        valid = s.is_not_null() & (s != "")
+        lost = valid & cast_string_expr(name, dtype, strip).is_null()
+        checks.append(lost.sum().alias(name))
+    row = df.lazy().select(checks).collect().row(0, named=True)
+    return [name for name, count in row.items() if count > 0]
+
+
+def infer_types(df, sample_rows=1000, categorical_ratio=0.05, strip=True, **kw):
+    """
+    Convert the string columns of a DataFrame or LazyFrame to the types
+    inferred by `infer_string_types`, with all casts in one `with_columns`.
+
+    The types are guessed from a sample, so the casts are checked over all
+    rows first: a column with a value its type can't hold is widened, an
+    integer column to float and any other column back to String, and no
+    value becomes null.
+
+    ```python
+    df = pl.read_csv(fn, infer_schema=False).pipe(infer_types)
+    ```
+    """
+    float_type = kw.get("float_type", pl.Float64)
+    schema = infer_string_types(df, sample_rows, categorical_ratio, strip, **kw)
+    while lost := lossy_casts(df, schema, strip):
+        for name in lost:
+            if schema[name] != float_type and schema[name].is_integer():
+                schema[name] = float_type
+            else:
+                del schema[name]
+    return df.with_columns(cast_string_expr(name, dtype, strip) for name, dtype in schema.items())
+
+
+def infer_csv_schema_overrides(source, sample_rows=1000, categorical_ratio=0.05, **read_kw):
+    """
+    `schema_overrides` for `pl.read_csv` or `pl.scan_csv` from the types of
+    the first `sample_rows` rows of a CSV file, read as strings.
+
+    Values are classified as the CSV parser sees them, without stripping.
+    A value past the sample that doesn't fit its column type makes the CSV
+    parser raise an error, it doesn't become null.
+
+    ```python
+    lf = pl.scan_csv(fn, schema_overrides=infer_csv_schema_overrides(fn))
+    ```
+    """
+    sample = pl.read_csv(source, n_rows=sample_rows, infer_schema=False, **read_kw)
+    return infer_string_types(sample, None, categorical_ratio, strip=False)
+
+
 def get_caller_line(level=2):
-    import inspect
-    frame = inspect.currentframe()
-    for i in range(level):
-        frame = frame.f_back
-    caller_source = inspect.getsourcelines(frame)[0]
-    current_lineno = frame.f_lineno  # Current line number
+    import sys
+    frame = sys._getframe(level)
+    return source_line(frame.f_code, frame.f_lineno)
 
-    target_line = caller_source[current_lineno - 1]
-    return target_line
 
-def load_data(folder_path, dtypes, level=2):
-    target_line = get_caller_line(level=level)
-    
-    # Extract variable names before the '='
+@cache
+def source_line(code, lineno):
+    """Line `lineno` of the file of a code object; re-executed notebook cells compile to new code objects."""
+    import linecache
+    return linecache.getline(code.co_filename, lineno)
+
+
+@cache
+def assigned_names(code, lineno):
+    """Names on the left of the `=` of line `lineno`, `df_a, df_b = ...` gives ("df_a", "df_b")."""
+    target_line = source_line(code, lineno)
     var_names = target_line.split('=')[0].strip()
-    var_names = [name.strip() for name in var_names.split(',')]
+    return tuple(name.strip() for name in var_names.split(','))
+
+DATA_MANIFEST_NAME = "data_manifest.json"
+KNOCKS_SCHEMA_OVERRIDES = {
+    'customer_id': str,
+    'gender_cd': str,
+    'postal_cd': str,
+    'application_store_cd': str,
+    'status_cd': str,
+    'category_major_cd': str,
+    'category_medium_cd': str,
+    'category_small_cd': str,
+    'product_cd': str,
+    'store_cd': str,
+    'prefecture_cd': str,
+    'tel_no': str,
+    'street': str
+}
+
+
+def schema_key(schema_overrides, columns):
+    """The overrides of `columns` with comparable dtype names."""
+    return {
+        name: str(pl.Series(dtype=dtype).dtype)
+        for name, dtype in (schema_overrides or {}).items()
+        if name in columns
+    }
+
+
+def source_sha256(path):
+    """sha256 of a file, hashed again only when its mtime or size changes."""
+    st = path.stat()
+    return _source_sha256(str(path.resolve()), st.st_mtime_ns, st.st_size)
+
+
+@cache
+def _source_sha256(path, mtime_ns, size):
+    import hashlib
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_unchanged(path, entry):
+    """
+    Whether a CSV file still is the one of its manifest entry.
+
+    In the browser reading the CSV would download it, which the Parquet
+    copy is there to avoid, so only its size is compared; on CPython its
+    sha256 is compared with the one recorded at build time too.
+    """
+    import sys
+    if path.stat().st_size != entry["source_size"]:
+        return False
+    if sys.platform == "emscripten":
+        return True
+    return source_sha256(path) == entry["source_sha256"]
+
+
+def read_data_source(path, schema_overrides=None, lazy=False):
+    """
+    Read a CSV file, or the Parquet file converted from it at build time
+    (see data_convert.py) when the CSV is unchanged, see `source_unchanged`,
+    and it was converted with the same schema overrides.
+    """
+    manifest_path = path.parent / DATA_MANIFEST_NAME
+    if manifest_path.exists():
+        with open(manifest_path, encoding="utf-8") as f:
+            entry = json.load(f).get(path.name)
+        if (
+            entry is not None
+            and (path.parent / entry["file"]).exists()
+            and source_unchanged(path, entry)
+            and schema_key(schema_overrides, entry["columns"]) == entry["schema_overrides"]
+        ):
+            if lazy:
+                return pl.scan_parquet(path.parent / entry["file"])
+            return pl.read_parquet(path.parent / entry["file"])
+    if lazy:
+        return pl.scan_csv(path, schema_overrides=schema_overrides)
+    return pl.read_csv(path, schema_overrides=schema_overrides)
+
+
+# {cache file name: DataFrame} of `read_data` in the browser
+_data_memo = {}
+
+
+def data_cache_dir():
+    """
+    `$HELPER_DATA_CACHE`, by default `~/.cache/helper-polars`, or None in
+    Pyodide: its home folder is in-memory MEMFS, where a cache file would
+    only hold a second copy of the data until the page is reloaded.
+    """
+    import os
+    import sys
+    from pathlib import Path
+    if "HELPER_DATA_CACHE" in os.environ:
+        return Path(os.environ["HELPER_DATA_CACHE"])
+    if sys.platform == "emscripten":
+        return None
+    return Path.home() / ".cache" / "helper-polars"
+
+
+def data_cache_path(path, schema_overrides, cache_dir):
+    """
+    Arrow IPC cache file of a data file, named after its path and keyed by
+    its mtime, size and the schema overrides.
+    """
+    import hashlib
+    from pathlib import Path
+    st = path.stat()
+    full_path = str(path.resolve())
+    key = json.dumps([full_path, st.st_mtime_ns, st.st_size, schema_key(schema_overrides, list(schema_overrides or {}))])
+    path_digest = hashlib.sha256(full_path.encode("utf-8")).hexdigest()[:8]
+    key_digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return Path(cache_dir or ".") / f"{path.stem}-{path_digest}-{key_digest}.arrow"
+
+
+def read_data(file_path, schema_overrides=None, lazy=False, cache=True):
+    """
+    Read a data file through an Arrow IPC cache.
+
+    The first call reads the CSV file, or its Parquet copy, and writes it
+    uncompressed to the cache folder (see `data_cache_dir`); later calls
+    memory map the cache file, until the mtime or size of the CSV file or
+    the schema overrides change. In the browser the DataFrame is kept in
+    memory instead, for the lifetime of the kernel.
+
+    Parameters:
+        lazy: Return a LazyFrame that scans the file instead of a DataFrame.
+        cache: Read the source file every time when False.
+    """
+    from pathlib import Path
+
+    path = Path(file_path)
+    if not path.exists():
+        raise FileNotFoundError(file_path)
+    if not cache:
+        return read_data_source(path, schema_overrides, lazy)
+
+    cache_dir = data_cache_dir()
+    cache_path = data_cache_path(path, schema_overrides, cache_dir)
+    prefix = cache_path.name[:-len("-0123456789abcdef.arrow")]
+    if cache_dir is None:
+        if cache_path.name not in _data_memo:
+            for stale in [name for name in _data_memo if name.startswith(prefix + "-")]:
+                del _data_memo[stale]
+            _data_memo[cache_path.name] = read_data_source(path, schema_overrides)
+        df = _data_memo[cache_path.name]
+        return df.lazy() if lazy else df
+
+    if not cache_path.exists():
+        df = read_data_source(path, schema_overrides)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        df.write_ipc(tmp_path, compression="uncompressed")
+        tmp_path.replace(cache_path)
+        # the previous versions of the same file
+        for stale in cache_dir.glob(prefix + "-*.arrow"):
+            if stale != cache_path:
+                stale.unlink(missing_ok=True)
+        if not lazy:
+            return df
+    if lazy:
+        return pl.scan_ipc(cache_path)
+    return pl.read_ipc(cache_path)
+
+
+def load_data(folder_path, dtypes, level=2, lazy=False):
+    """
+    Load the CSV files named after the variables the result is assigned
+    to, `df_customer, df_store = load_data("data", dtypes)` reads
+    `data/customer.csv` and `data/store.csv`, see `read_data`.
+    """
+    import sys
+    frame = sys._getframe(level - 1)
+    var_names = assigned_names(frame.f_code, frame.f_lineno)
 
     # Load CSV files matching the variable names
     results = []
@@ -254,7 +1061,7 @@ def load_data(folder_path, dtypes, level=2):
             var_name = var_name[3:]
         file_path = f"{folder_path}/{var_name}.csv"
         try:
-            df = pl.read_csv(file_path, schema_overrides=dtypes)
+            df = read_data(file_path, schema_overrides=dtypes, lazy=lazy)
             results.append(df)
         except FileNotFoundError:
             raise FileNotFoundError(f"CSV file not found for variable '{var_name}': {file_path}")
@@ -265,25 +1072,9 @@ def load_data(folder_path, dtypes, level=2):
         return results
 
 
-def load_100knocks_data():
+def load_100knocks_data(lazy=False):
     pl.Config.set_fmt_str_lengths(100)
-    dtypes = {
-        'customer_id': str,
-        'gender_cd': str,
-        'postal_cd': str,
-        'application_store_cd': str,
-        'status_cd': str,
-        'category_major_cd': str,
-        'category_medium_cd': str,
-        'category_small_cd': str,
-        'product_cd': str,
-        'store_cd': str,
-        'prefecture_cd': str,
-        'tel_no': str,
-        'postal_cd': str,
-        'street': str
-    }    
-    return load_data('data', dtypes, level=3)            
+    return load_data('data', KNOCKS_SCHEMA_OVERRIDES, level=3, lazy=lazy)            
 
 
 def get_expr_functions(root, show_error=False):
@@ -379,8 +1170,16 @@ def with_columns_chain(self: pl.DataFrame, *args, **kw) -> pl.DataFrame:
         return df.collect()
 
 
-if getattr(pl.DataFrame, "with_columns_chain", None) is not with_columns_chain:
-    setattr(pl.DataFrame, "with_columns_chain", with_columns_chain)   
+def install_methods():
+    """Add the helper methods to polars, called when this module is imported."""
+    for cls in (pl.DataFrame, pl.LazyFrame):
+        if getattr(cls, "list_eval", None) is not list_eval:
+            cls.list_eval = list_eval
+    if getattr(pl.DataFrame, "with_columns_chain", None) is not with_columns_chain:
+        pl.DataFrame.with_columns_chain = with_columns_chain
+
+
+install_methods()
 
 def create_datetime_sample_data(n=10):
     now = datetime(2024, 12, 10, 10, 32, 14)
@@ -438,19 +1237,27 @@ class pyarrow_batch(batch_base):
     """
     Batch processor for pyarrow arrays. Converts Series to Arrow arrays and back.
     """
-    array_type = pa.Array
     from_series = staticmethod(pl.Series.to_arrow)
     to_series = staticmethod(pl.from_arrow)
 
+    @property
+    def array_type(self):
+        import pyarrow as pa
+        return pa.Array
+
 
 class numpy_batch(batch_base):
     """
     Batch processor for numpy arrays. Converts Series to NumPy arrays and back.
     """
-    array_type = np.ndarray
     from_series = staticmethod(pl.Series.to_numpy)
     to_series = staticmethod(pl.Series)
 
+    @property
+    def array_type(self):
+        import numpy as np
+        return np.ndarray
+
 
 def when_map(col_name, *args, default_value=None):
     if isinstance(col_name, str):
@@ -754,21 +1561,24 @@ def expression_replace(expr, mapper=None, **kw):
     if mapper is None:
         mapper = kw
 
+    # serialized expressions can be plain strings, such as "Element" for pl.element(),
+    # so they are kept apart from the column renames
+    renames = {key: val for key, val in mapper.items() if isinstance(val, str)}
+    replacements = {
+        key: json.loads(val.meta.serialize(format='json'))
+        for key, val in mapper.items()
+        if isinstance(val, pl.Expr)
+    }
+
     def convert_column(expr):
         if 'Column' in expr:
             column_name = expr['Column']
-            if column_name in mapper:
+            if column_name in renames:
                 # Replace the column name using the mapper
-                to_replace = mapper[column_name]
-                if isinstance(to_replace, str):
-                    expr['Column'] = to_replace
-                else:
-                    expr = to_replace
+                expr['Column'] = renames[column_name]
+            elif column_name in replacements:
+                expr = replacements[column_name]
         return expr
-        
-    for key, val in mapper.items():
-        if isinstance(val, pl.Expr):
-            mapper[key] = json.loads(val.meta.serialize(format='json'))
             
     expr_json = json.loads(expr.meta.serialize(format='json'), object_hook=convert_column)
     new_expr = pl.Expr.deserialize(StringIO(json.dumps(expr_json)), format='json')
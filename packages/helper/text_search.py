@@ -0,0 +1,85 @@
+"""
+Tokenizer and ranking of the full-text search index of the shipped notebooks.
+
+The index is written at build time by `search_index.py` with the same
+tokenizer, and queried in the kernel by `helper.jupyterlite.search`.
+"""
+import math
+import re
+
+# words of ascii letters, digits and underscores, and runs of kana and kanji
+WORD_PATTERN = re.compile(r"[0-9a-z_]{2,}|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+")
+MAX_WORD_LENGTH = 40
+ASCII_PREFIX_LENGTH = 2
+CJK_BLOCK_BITS = 6
+
+
+def tokenize(text):
+    """
+    Split text into index terms.
+
+    Japanese has no spaces, so runs of kana and kanji become overlapping
+    character bigrams; a query matches when all of its bigrams do.
+    """
+    for match in WORD_PATTERN.finditer(text.lower()):
+        word = match.group()
+        if word.isascii():
+            yield word[:MAX_WORD_LENGTH]
+        elif len(word) == 1:
+            yield word
+        else:
+            for i in range(len(word) - 1):
+                yield word[i : i + 2]
+
+
+def shard_name(term):
+    """
+    Name of the shard holding `term`: the hex of its first two characters,
+    or of the block of 64 code points of its first character for kana and
+    kanji, which would otherwise give one tiny shard per character.
+    """
+    if term.isascii():
+        return term[:ASCII_PREFIX_LENGTH].encode("ascii").hex()
+    return f"u{ord(term[0]) >> CJK_BLOCK_BITS:x}"
+
+
+def rank(terms, postings, doc_count, limit=20):
+    """
+    Rank the documents that contain every term.
+
+    Parameters:
+        terms: Query terms from `tokenize`.
+        postings: {term: [[doc id, cell index, count], ...]}.
+        doc_count: Number of indexed documents.
+
+    Returns:
+        list: (doc id, score, cell indices sorted by score), best first.
+    """
+    terms = list(dict.fromkeys(terms))
+    if not terms:
+        return []
+
+    docs = None
+    for term in terms:
+        term_docs = {doc for doc, _, _ in postings.get(term, [])}
+        docs = term_docs if docs is None else docs & term_docs
+        if not docs:
+            return []
+
+    scores = {}
+    cell_scores = {}
+    for term in terms:
+        entries = postings[term]
+        idf = math.log(1 + doc_count / len({doc for doc, _, _ in entries}))
+        for doc, cell, count in entries:
+            if doc in docs:
+                score = (1 + math.log(count)) * idf
+                scores[doc] = scores.get(doc, 0) + score
+                cells = cell_scores.setdefault(doc, {})
+                cells[cell] = cells.get(cell, 0) + score
+
+    best = sorted(scores, key=lambda doc: -scores[doc])[:limit]
+    return [
+        (doc, scores[doc], sorted(cell_scores[doc], key=lambda cell: -cell_scores[doc][cell]))
+        for doc in best
+    ]
@@ -1,89 +1,283 @@
 import os
 from pathlib import Path
-import requests
 
 
-def print_folder_structure(folder, indent=0, max_file_count=100):
-    """Recursively print the folder structure."""
-    file_count = 0
-    flag = False
-    for entry in Path(folder).iterdir():
-        if entry.is_file:
-            file_count += 1
+def print_folder_structure(folder, indent=0, max_file_count=100, max_depth=None):
+    """Print the folders with their sizes and at most `max_file_count` files each."""
+    from .inventory import Inventory
 
-        if not entry.is_file or file_count <= max_file_count:
-            print(" " * indent + "|-- " + entry.name)
+    Inventory(folder, max_depth=max_depth).print_tree(max_file_count, indent)
+
+
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_RAW_URL = "https://raw.githubusercontent.com"
+
+
+def git_blob_sha(path):
+    """The sha1 git gives a file's content, as listed by the trees API."""
+    import hashlib
+
+    h = hashlib.sha1(f"blob {os.path.getsize(path)}\0".encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_github_folder_url(github_url):
+    """Split https://github.com/user/repo/tree/branch/folder into (user/repo, branch, folder)."""
+    if "/tree/" not in github_url:
+        raise ValueError("The URL does not point to a folder in a GitHub repository.")
+    base_url, branch_path = github_url.rstrip("/").split("/tree/")
+    owner_repo = base_url.split("github.com/")[1]
+    branch, _, folder_path = branch_path.partition("/")
+    return owner_repo, branch, folder_path
+
+
+def download_github_file(session, url, path, sha):
+    """
+    Download one file unless a file with the same blob sha exists.
+
+    The data is written to `path + ".part"` first, so an interrupted
+    download continues with a range request.
+
+    Returns "skipped", "resumed" or "downloaded".
+    """
+    if os.path.exists(path) and git_blob_sha(path) == sha:
+        return "skipped"
+
+    part_path = path + ".part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with session.get(url, headers=headers, stream=True) as response:
+        if response.status_code == 416:
+            # the part file is already complete
+            status = "resumed"
         else:
-            flag = True
-            
-        if entry.is_dir():
-            print_folder_structure(entry, indent + 4, max_file_count)
+            response.raise_for_status()
+            resumed = offset and response.status_code == 206
+            status = "resumed" if resumed else "downloaded"
+            with open(part_path, "ab" if resumed else "wb") as f:
+                for chunk in response.iter_content(1 << 16):
+                    f.write(chunk)
+
+    if git_blob_sha(part_path) != sha:
+        os.remove(part_path)
+        raise ValueError(f"Downloaded {url} does not match its blob sha {sha}")
+    os.replace(part_path, path)
+    return status
 
-    if flag:
-        print(" " * indent + "|-- " + '...')
 
+def github_headers():
+    headers = {"Accept": "application/vnd.github+json"}
+    if os.environ.get("GITHUB_TOKEN"):
+        headers["Authorization"] = f"Bearer {os.environ['GITHUB_TOKEN']}"
+    return headers
 
-def download_folder_from_github(github_url, target_folder):
+
+def github_tree_url(owner_repo, branch, folder_path, api_url=GITHUB_API_URL):
+    """URL of the recursive git tree of a folder, one call lists all its files."""
+    from urllib.parse import quote
+
+    tree_ish = f"{branch}:{folder_path}" if folder_path else branch
+    return f"{api_url}/repos/{owner_repo}/git/trees/{quote(tree_ish, safe='')}?recursive=1"
+
+
+def github_download_jobs(tree, github_url, target_folder, raw_url=GITHUB_RAW_URL):
+    """Return [(url, path, sha)] of the files of a git tree, creating their folders."""
+    from urllib.parse import quote
+
+    owner_repo, branch, folder_path = parse_github_folder_url(github_url)
+    if tree.get("truncated"):
+        print(f"The listing of {github_url} is truncated, some files are missing.")
+    prefix = f"{folder_path}/" if folder_path else ""
+    jobs = []
+    for item in tree["tree"]:
+        if item["type"] != "blob":
+            continue
+        path = os.path.join(target_folder, *item["path"].split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        url = f"{raw_url}/{owner_repo}/{quote(branch)}/{quote(prefix + item['path'])}"
+        jobs.append((url, path, item["sha"]))
+    return jobs
+
+
+def download_summary(statuses, target_folder):
+    summary = {status: statuses.count(status) for status in ("downloaded", "resumed", "skipped")}
+    print(
+        f"Folder successfully downloaded to: {target_folder} "
+        f"({summary['downloaded']} downloaded, {summary['resumed']} resumed, {summary['skipped']} unchanged)"
+    )
+    return summary
+
+
+def download_folder_from_github(
+    github_url,
+    target_folder,
+    max_workers=8,
+    api_url=GITHUB_API_URL,
+    raw_url=GITHUB_RAW_URL,
+):
     """
-    Downloads a folder and its contents from a GitHub repository using the GitHub API.
+    Downloads a folder and its contents from a GitHub repository.
+
+    The whole folder is listed with one recursive call of the git trees API
+    and the files are downloaded concurrently with a shared session. Files
+    whose content already matches are skipped and interrupted downloads are
+    resumed, so the function can simply be called again after a failure.
+
+    Pyodide cannot start threads, so there it returns the task of
+    `download_folder_from_github_async`, which downloads the files with
+    concurrent `pyfetch` calls; await it:
+
+    ```python
+    await download_folder_from_github("https://github.com/user/repo/tree/main/data", "data")
+    ```
 
     Parameters:
         github_url (str): The GitHub URL of the folder (e.g., https://github.com/user/repo/tree/main/folder).
         target_folder (str): The local folder where the downloaded files should be saved.
+        max_workers (int): Number of concurrent downloads.
+        api_url, raw_url (str): Base URLs of the GitHub API and of the raw files,
+            e.g. a local server in tests. The GITHUB_TOKEN environment variable
+            is sent to the API when set.
 
     Returns:
-        None
+        dict: {"downloaded": n, "resumed": n, "skipped": n}
 
     Raises:
         ValueError: If the URL is invalid or cannot be processed.
     """
-    if  Path(target_folder).exists:
-        print(f'{target_folder} exists, please delete and try again.')
-        return
-    
-    try:
-        # Parse the GitHub URL to extract owner, repo, branch, and folder path
-        if "/tree/" not in github_url:
-            raise ValueError("The URL does not point to a folder in a GitHub repository.")
+    import sys
 
-        base_url, branch_path = github_url.split("/tree/")
-        owner_repo = base_url.split("github.com/")[1]
-        branch, folder_path = branch_path.split("/", 1)
+    if sys.platform == "emscripten":
+        import asyncio
 
-        # GitHub API URL to get folder contents
-        api_url = f"https://api.github.com/repos/{owner_repo}/contents/{folder_path}?ref={branch}"
+        return asyncio.ensure_future(
+            download_folder_from_github_async(github_url, target_folder, max_workers, api_url, raw_url)
+        )
 
-        # Fetch folder contents
-        response = requests.get(api_url)
-        response.raise_for_status()
-
-        items = response.json()
+    import requests
 
-        # Create target folder if it does not exist
-        os.makedirs(target_folder, exist_ok=True)
-
-        for item in items:
-            item_name = item['name']
-            item_path = os.path.join(target_folder, item_name)
+    owner_repo, branch, folder_path = parse_github_folder_url(github_url)
+    session = requests.Session()
+    try:
+        response = session.get(github_tree_url(owner_repo, branch, folder_path, api_url), headers=github_headers())
+        response.raise_for_status()
+        jobs = github_download_jobs(response.json(), github_url, target_folder, raw_url)
 
-            if item['type'] == 'file':
-                # Download and save file
-                file_response = requests.get(item['download_url'])
-                file_response.raise_for_status()
-                with open(item_path, 'wb') as f:
-                    f.write(file_response.content)
-            elif item['type'] == 'dir':
-                # Recursively download folder
-                download_folder_from_github(f"{github_url}/{item_name}", item_path)
+        if max_workers <= 1:
+            statuses = [download_github_file(session, *job) for job in jobs]
+        else:
+            from concurrent.futures import ThreadPoolExecutor
 
-        print(f"Folder successfully downloaded to: {target_folder}")
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                statuses = list(pool.map(lambda job: download_github_file(session, *job), jobs))
+        return download_summary(statuses, target_folder)
 
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data from GitHub: {e}")
         raise
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        raise
+    finally:
+        session.close()
+
+
+async def pyfetch_bytes(url, headers):
+    """Fetch `url` with `pyodide.http.pyfetch`, return (status, body)."""
+    from pyodide.http import pyfetch
+
+    response = await pyfetch(url, headers=headers)
+    return response.status, await response.bytes()
+
+
+async def download_github_file_async(fetch, url, path, sha):
+    """`download_github_file` with an async `fetch(url, headers) -> (status, body)`."""
+    if os.path.exists(path) and git_blob_sha(path) == sha:
+        return "skipped"
+
+    part_path = path + ".part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    status_code, body = await fetch(url, headers)
+    if status_code == 416:
+        # the part file is already complete
+        status = "resumed"
+    else:
+        if status_code >= 400:
+            raise OSError(f"Error fetching {url}: HTTP {status_code}")
+        resumed = offset and status_code == 206
+        status = "resumed" if resumed else "downloaded"
+        with open(part_path, "ab" if resumed else "wb") as f:
+            f.write(body)
+
+    if git_blob_sha(part_path) != sha:
+        os.remove(part_path)
+        raise ValueError(f"Downloaded {url} does not match its blob sha {sha}")
+    os.replace(part_path, path)
+    return status
+
+
+async def download_folder_from_github_async(
+    github_url,
+    target_folder,
+    max_concurrency=8,
+    api_url=GITHUB_API_URL,
+    raw_url=GITHUB_RAW_URL,
+    fetch=None,
+):
+    """
+    `download_folder_from_github` for Pyodide: the files are downloaded
+    with `asyncio.gather`, at most `max_concurrency` at a time.
+
+    `fetch(url, headers) -> (status, body)` defaults to `pyodide.http.pyfetch`.
+    """
+    import asyncio
+    import json
+
+    fetch = fetch or pyfetch_bytes
+    owner_repo, branch, folder_path = parse_github_folder_url(github_url)
+    status_code, body = await fetch(github_tree_url(owner_repo, branch, folder_path, api_url), github_headers())
+    if status_code >= 400:
+        raise OSError(f"Error fetching data from GitHub: HTTP {status_code}")
+    jobs = github_download_jobs(json.loads(body), github_url, target_folder, raw_url)
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def download(job):
+        async with semaphore:
+            return await download_github_file_async(fetch, *job)
+
+    statuses = await asyncio.gather(*(download(job) for job in jobs))
+    return download_summary(list(statuses), target_folder)
+
+
+def cached_result(file_name, func, *args, **kw):
+    """
+    Load the result of `func(*args, **kw)` from `file_name`, or compute it
+    and save it there.
+
+    Saved by cells tagged `prebuild` at build time, the file ships next to
+    the notebook and the first view doesn't have to compute it.
+    `.npz` files hold a dict of arrays, other files are pickled.
+    """
+    path = Path(file_name)
+    if path.suffix == ".npz":
+        import numpy as np
+        if path.exists():
+            with np.load(path) as data:
+                return dict(data)
+        result = func(*args, **kw)
+        np.savez_compressed(path, **result)
+        return result
+
+    import pickle
+    if path.exists():
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    result = func(*args, **kw)
+    with open(path, "wb") as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return result
 
 
 def plot_group_by_dynamic(index, every, offset=None, period=None, start_by='window'):
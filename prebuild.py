@@ -0,0 +1,221 @@
+import hashlib
+import json
+import shutil
+import sys
+from pathlib import Path
+from preload import cell_source, find_imports, find_local_module, strip_magics
+from wheels import file_sha256
+
+try:
+    import nbformat
+    from jupyter_client.kernelspec import NoSuchKernel
+    from nbclient import NotebookClient
+    from nbclient.exceptions import CellExecutionError, CellTimeoutError, DeadKernelError
+
+    # a failing notebook is left for the browser to run, the site build goes on
+    EXECUTION_ERRORS = (CellExecutionError, CellTimeoutError, DeadKernelError, NoSuchKernel, RuntimeError)
+except ImportError:
+    NotebookClient = None
+
+DIST_FOLDER = Path("./dist")
+PACKAGE_FOLDER = Path("./packages")
+CACHE_FOLDER = Path("./prebuild_cache")
+PREBUILD_TAG = "prebuild"
+CELL_TIMEOUT = 600
+
+
+def cell_tags(cell):
+    return cell.get("metadata", {}).get("tags", [])
+
+
+def prebuild_cells(nb):
+    return [
+        cell
+        for cell in nb.get("cells", [])
+        if cell["cell_type"] == "code" and PREBUILD_TAG in cell_tags(cell)
+    ]
+
+
+def find_input_files(path, cells, package_folder):
+    """
+    Files the outputs of `cells` depend on: the local modules they import,
+    recursively, and the files listed in `metadata.prebuild.inputs` of the
+    cells, relative to the notebook.
+    """
+    folder = path.parent
+    search_folders = [folder, package_folder]
+    files = set()
+    todo = []
+    for cell in cells:
+        todo.extend(find_imports(strip_magics(cell_source(cell))))
+        for pattern in cell.get("metadata", {}).get(PREBUILD_TAG, {}).get("inputs", []):
+            files.update(p for p in folder.glob(pattern) if p.is_file())
+
+    visited = set()
+    while todo:
+        name = todo.pop()
+        if name in visited:
+            continue
+        visited.add(name)
+        module = find_local_module(name, search_folders)
+        if module is not None:
+            files.add(module)
+            todo.extend(find_imports(module.read_text(encoding="utf-8")))
+    return sorted(files)
+
+
+def snapshot_folder(folder):
+    return {
+        path: (path.stat().st_mtime_ns, path.stat().st_size)
+        for path in folder.rglob("*")
+        if path.is_file() and not {".ipynb_checkpoints", "__pycache__"} & set(path.parts)
+    }
+
+
+class Prebuilder:
+    """
+    Execute the code cells tagged `prebuild` of the notebooks in a built
+    site on CPython and store their outputs in the shipped notebooks.
+
+    The tagged cells of a notebook run in order in one kernel, with the
+    notebook folder as working directory, so they can also save results
+    (e.g. with `helper.utils.cached_result`) that the notebook loads in the
+    browser. Outputs and result files are cached in `cache_folder`, keyed by
+    the source of the tagged cells and the hashes of their input files, and
+    a notebook only runs again when that key changes.
+
+    Example
+    -------
+
+    ```python
+    report = Prebuilder("dist/files").run()
+    ```
+    """
+
+    def __init__(self, files_folder, cache_folder=CACHE_FOLDER, package_folder=PACKAGE_FOLDER):
+        self.files_folder = Path(files_folder)
+        self.cache_folder = Path(cache_folder)
+        self.package_folder = Path(package_folder)
+
+    def cache_key(self, path, cells):
+        inputs = {}
+        for input_path in find_input_files(path, cells, self.package_folder):
+            try:
+                name = input_path.relative_to(path.parent).as_posix()
+            except ValueError:
+                name = input_path.relative_to(self.package_folder).as_posix()
+            inputs[name] = file_sha256(input_path)
+        data = {"sources": [cell_source(cell) for cell in cells], "inputs": inputs}
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    def execute(self, path, cells):
+        """Run `cells` in a new kernel, return (outputs, execution counts, new files)."""
+        bootstrap = f"import sys\nsys.path.insert(0, {str(self.package_folder.resolve())!r})"
+        nb = nbformat.v4.new_notebook()
+        nb.cells = [nbformat.v4.new_code_cell(bootstrap)] + [
+            nbformat.v4.new_code_cell(cell_source(cell)) for cell in cells
+        ]
+        before = snapshot_folder(path.parent)
+        client = NotebookClient(
+            nb,
+            timeout=CELL_TIMEOUT,
+            kernel_name="python3",
+            resources={"metadata": {"path": str(path.parent)}},
+        )
+        client.execute()
+        after = snapshot_folder(path.parent)
+        files = sorted(
+            p.relative_to(path.parent).as_posix()
+            for p, stat in after.items()
+            if before.get(p) != stat and p != path
+        )
+        # the bootstrap cell is execution 1
+        executed = nb.cells[1:]
+        outputs = json.loads(json.dumps([cell.outputs for cell in executed]))
+        for output in (output for cell_outputs in outputs for output in cell_outputs):
+            if output.get("execution_count"):
+                output["execution_count"] -= 1
+        counts = [cell.execution_count and cell.execution_count - 1 for cell in executed]
+        return outputs, counts, files
+
+    def prebuild_notebook(self, path):
+        """
+        Fill in the outputs of the tagged cells of one notebook.
+
+        Returns:
+            str: "cached", "executed", "failed" or None without tagged cells.
+        """
+        with open(path, encoding="utf-8") as f:
+            nb = json.load(f)
+        cells = prebuild_cells(nb)
+        if not cells:
+            return None
+
+        rel = path.relative_to(self.files_folder)
+        cache_file = self.cache_folder / rel.with_suffix(".json")
+        files_folder = self.cache_folder / rel.with_suffix(".files")
+        key = self.cache_key(path, cells)
+
+        entry = None
+        if cache_file.exists():
+            with open(cache_file, encoding="utf-8") as f:
+                entry = json.load(f)
+        status = "cached"
+        if entry is None or entry["key"] != key:
+            if NotebookClient is None:
+                print(f"⚠️ nbclient is not installed, {rel.as_posix()} is not prebuilt")
+                return "failed"
+            # stale results would be loaded instead of computed again
+            for name in entry["files"] if entry is not None else []:
+                (path.parent / name).unlink(missing_ok=True)
+            try:
+                outputs, counts, files = self.execute(path, cells)
+            except EXECUTION_ERRORS as e:
+                print(f"⚠️ prebuild of {rel.as_posix()} failed ({type(e).__name__}):\n{e}")
+                return "failed"
+            entry = {"key": key, "outputs": outputs, "execution_counts": counts, "files": files}
+            if files_folder.exists():
+                shutil.rmtree(files_folder)
+            for name in files:
+                dst = files_folder / name
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(path.parent / name, dst)
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(cache_file, "w", encoding="utf-8") as f:
+                json.dump(entry, f, indent=1, ensure_ascii=False)
+            status = "executed"
+        else:
+            for name in entry["files"]:
+                src = files_folder / name
+                dst = path.parent / name
+                if not dst.exists() or file_sha256(dst) != file_sha256(src):
+                    dst.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(src, dst)
+
+        for cell, outputs, count in zip(cells, entry["outputs"], entry["execution_counts"]):
+            cell["outputs"] = outputs
+            cell["execution_count"] = count
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(nb, f, indent=1, ensure_ascii=False)
+            f.write("\n")
+        return status
+
+    def run(self):
+        """Prebuild every notebook with tagged cells, return {notebook path: status}."""
+        report = {}
+        for path in sorted(self.files_folder.rglob("*.ipynb")):
+            if ".ipynb_checkpoints" in path.parts:
+                continue
+            status = self.prebuild_notebook(path)
+            if status is not None:
+                report[path.relative_to(self.files_folder).as_posix()] = status
+        return report
+
+
+if __name__ == "__main__":
+    # python prebuild.py [dist]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    dist_folder = Path(args[0]) if args else DIST_FOLDER
+    report = Prebuilder(dist_folder / "files").run()
+    for name, status in report.items():
+        print(f"{status:>9} {name}")
@@ -0,0 +1,197 @@
+import ast
+import json
+import re
+import sys
+from pathlib import Path
+
+IMPORT_PATTERN = re.compile(r"^\s*(?:from\s+([\w.]+)\s+import|import\s+([\w.]+))", re.M)
+MODULE_LEVEL_IMPORT_PATTERN = re.compile(r"^(?:from\s+([\w.]+)\s+import|import\s+([\w.]+))", re.M)
+
+
+def cell_source(cell):
+    source = cell["source"]
+    return "".join(source) if isinstance(source, list) else source
+
+
+def strip_magics(source):
+    """Turn IPython syntax into plain Python so that `ast` can parse it."""
+    lines = source.splitlines()
+    if lines and lines[0].startswith("%%"):
+        magic = lines[0][2:].split()[0] if lines[0][2:].strip() else ""
+        if magic not in ("time", "timeit", "capture", "capture_except"):
+            return ""
+        lines = lines[1:]
+    return "\n".join(
+        "" if line.lstrip().startswith(("%", "!")) else line for line in lines
+    )
+
+
+def iter_module_level_nodes(tree):
+    """Walk the nodes that run on import, skipping function bodies."""
+    todo = [tree]
+    while todo:
+        node = todo.pop()
+        yield node
+        for child in ast.iter_child_nodes(node):
+            if not isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+                todo.append(child)
+
+
+def find_imports(source, module_level=False):
+    """
+    Return the absolute module names imported by `source`.
+
+    With `module_level=True`, imports inside functions are left out: the
+    helper modules import their heavy dependencies lazily in the functions
+    that use them.
+
+    Code that does not parse falls back to a regex over import lines.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        pattern = MODULE_LEVEL_IMPORT_PATTERN if module_level else IMPORT_PATTERN
+        return [a or b for a, b in pattern.findall(source)]
+
+    names = []
+    for node in iter_module_level_nodes(tree) if module_level else ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.append(node.module)
+            # `from helper import polars` may import a submodule
+            names.extend(f"{node.module}.{alias.name}" for alias in node.names)
+    return names
+
+
+def notebook_imports(path):
+    with open(path, encoding="utf-8") as f:
+        nb = json.load(f)
+    names = []
+    for cell in nb.get("cells", []):
+        if cell["cell_type"] == "code":
+            names.extend(find_imports(strip_magics(cell_source(cell))))
+    return names
+
+
+def find_local_module(name, search_folders):
+    """Return the source file of module `name` in one of `search_folders`, or None."""
+    parts = name.split(".")
+    for folder in search_folders:
+        base = Path(folder).joinpath(*parts)
+        for path in (base.with_suffix(".py"), base / "__init__.py"):
+            if path.is_file():
+                return path
+    return None
+
+
+def collect_top_level_imports(path, package_folder):
+    """
+    Top level import names used by a notebook, following the module level
+    imports of the companion modules next to it and of the local source
+    packages it imports.
+    """
+    path = Path(path)
+    search_folders = [path.parent, package_folder]
+    todo = notebook_imports(path)
+    visited = set()
+    top_level = set()
+    while todo:
+        name = todo.pop()
+        if name in visited:
+            continue
+        visited.add(name)
+        top_level.add(name.split(".")[0])
+        module = find_local_module(name, search_folders)
+        if module is not None:
+            todo.extend(find_imports(module.read_text(encoding="utf-8"), module_level=True))
+    return top_level
+
+
+def build_import_map(packages):
+    """Map every import name of the lock to its package."""
+    imports = {}
+    for name, info in packages.items():
+        for import_name in info.get("imports", []):
+            imports.setdefault(import_name, name)
+    return imports
+
+
+def build_preload_manifest(content_folder, package_folder, graph):
+    """
+    Return {notebook path: [package, ...]} with the dependency closure of
+    the packages every notebook under `content_folder` imports.
+    """
+    content_folder = Path(content_folder)
+    imports = build_import_map(graph.packages)
+    manifest = {}
+    for path in sorted(content_folder.rglob("*.ipynb")):
+        if ".ipynb_checkpoints" in path.parts:
+            continue
+        names = collect_top_level_imports(path, package_folder)
+        roots = sorted({imports[name] for name in names if name in imports})
+        if roots:
+            key = path.relative_to(content_folder).as_posix()
+            manifest[key] = sorted(graph.closure(roots))
+    return manifest
+
+
+PRELOAD_CELL_TAG = "preload"
+DIST_FOLDER = Path("./dist")
+
+
+def preload_cell(key, nbformat_minor):
+    cell = {
+        "cell_type": "code",
+        "execution_count": None,
+        "metadata": {"jupyter": {"source_hidden": True}, "tags": [PRELOAD_CELL_TAG]},
+        "outputs": [],
+        "source": [
+            "from helper.jupyterlite import preload_packages\n",
+            f"await preload_packages({key!r})",
+        ],
+    }
+    if nbformat_minor >= 5:
+        cell["id"] = "preload"
+    return cell
+
+
+def add_preload_cells(files_folder, manifest):
+    """
+    Insert a collapsed first cell that calls `helper.jupyterlite.preload_packages`
+    into every notebook of `files_folder` listed in the preload manifest, so
+    running the notebook from the top loads its packages in one batch.
+
+    Notebooks that already have the cell are only written when it changed.
+
+    Returns:
+        int: number of notebooks written.
+    """
+    written = 0
+    for key in manifest:
+        path = Path(files_folder) / key
+        if not path.exists():
+            continue
+        with open(path, encoding="utf-8") as f:
+            nb = json.load(f)
+        cells = nb.setdefault("cells", [])
+        cell = preload_cell(key, nb.get("nbformat_minor", 0))
+        if cells and PRELOAD_CELL_TAG in cells[0].get("metadata", {}).get("tags", []):
+            if cells[0] == cell:
+                continue
+            cells[0] = cell
+        else:
+            cells.insert(0, cell)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(nb, f, indent=1, ensure_ascii=False)
+            f.write("\n")
+        written += 1
+    return written
+
+
+if __name__ == "__main__":
+    dist_folder = Path(sys.argv[1]) if len(sys.argv) > 1 else DIST_FOLDER
+    with open(dist_folder / "static" / "pyodide" / "preload.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    written = add_preload_cells(dist_folder / "files", manifest)
+    print(f"add the preload cell to {written} notebooks")
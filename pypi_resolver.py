@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+PYPI_URL = "https://pypi.org/pypi"
+CACHE_FOLDER = Path("./request_cach")
+CACHE_INDEX_FILE = CACHE_FOLDER / "index.json"
+CACHE_TTL = 24 * 3600
+MAX_WORKERS = 8
+CHUNK_SIZE = 1 << 16
+MIRROR_HOSTS = ("files.pythonhosted.org",)
+
+
+def create_session(max_workers=MAX_WORKERS):
+    """Create a requests session whose connection pool fits the worker count."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def load_cache_index():
+    if CACHE_INDEX_FILE.exists():
+        with open(CACHE_INDEX_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_cache_index(index):
+    CACHE_FOLDER.mkdir(exist_ok=True)
+    tmp_file = CACHE_INDEX_FILE.with_suffix(".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=4, sort_keys=True)
+    tmp_file.replace(CACHE_INDEX_FILE)
+
+
+def cache_file_name(pkg_name, version):
+    return CACHE_FOLDER / f"{pkg_name}@{version}"
+
+
+def read_cached_metadata(pkg_name, version):
+    cache_file = cache_file_name(pkg_name, version)
+    if not cache_file.exists():
+        return None
+    with open(cache_file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def fetch_metadata(
+    session, pkg_name, version, entry, base_url=PYPI_URL, ttl=CACHE_TTL, offline=False
+):
+    """
+    Return (data, entry, status) for one release of a package.
+
+    A fresh cache entry is used as is. A stale one is revalidated with
+    If-None-Match/If-Modified-Since, and is still used when the server
+    cannot be reached. In offline mode only the cache is consulted.
+    status is "cached", "revalidated", "fetched" or "failed".
+    """
+    cached = read_cached_metadata(pkg_name, version)
+    if cached is None:
+        entry = None
+
+    now = time.time()
+    if offline or (entry is not None and now - entry["fetched"] < ttl):
+        return cached, entry, "cached" if cached is not None else "failed"
+
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        resp = session.get(
+            f"{base_url}/{pkg_name}/{version}/json", headers=headers, timeout=10
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching {pkg_name}: {e}")
+        return cached, entry, "failed"
+
+    if resp.status_code == 304 and cached is not None:
+        return cached, dict(entry, fetched=now), "revalidated"
+    if resp.status_code != 200:
+        return cached, entry, "failed"
+
+    with open(cache_file_name(pkg_name, version), "w", encoding="utf-8") as f:
+        f.write(resp.text)
+    entry = {
+        "fetched": now,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+    return resp.json(), entry, "fetched"
+
+
+def find_wheel_info(data):
+    if data is None:
+        return None
+    for info in data["urls"]:
+        if info["filename"].endswith(".whl"):
+            return info
+    return None
+
+
+def resolve_release_metadata(
+    specs,
+    base_url=PYPI_URL,
+    ttl=CACHE_TTL,
+    offline=False,
+    max_workers=MAX_WORKERS,
+    stats=None,
+):
+    """
+    Fetch the JSON metadata of many releases in one parallel wave.
+
+    Parameters:
+        specs: Iterable of (package name, version) pairs.
+        base_url: PyPI JSON API root, point it to a local server for testing.
+        ttl: Seconds a cached response is used without revalidation.
+        offline: Only use the cache, never touch the network.
+        max_workers: Size of the thread pool and of the connection pool.
+        stats: Optional StageStats that receives cache hits and misses.
+
+    Returns:
+        dict: {(name, version): release metadata or None}
+    """
+    specs = sorted(set(specs))
+    CACHE_FOLDER.mkdir(exist_ok=True)
+    index = load_cache_index()
+
+    with create_session(max_workers) as session, ThreadPoolExecutor(max_workers) as pool:
+        results = pool.map(
+            lambda spec: fetch_metadata(
+                session,
+                *spec,
+                index.get("@".join(spec)),
+                base_url=base_url,
+                ttl=ttl,
+                offline=offline,
+            ),
+            specs,
+        )
+        metadata = {}
+        for spec, (data, entry, status) in zip(specs, results):
+            metadata[spec] = data
+            if entry is not None:
+                index["@".join(spec)] = entry
+            if stats is not None:
+                if status in ("cached", "revalidated"):
+                    stats.cache_hits += 1
+                else:
+                    stats.cache_misses += 1
+
+    save_cache_index(index)
+    return metadata
+
+
+def resolve_pythonhosted_infos(specs, **kw):
+    """Return {(name, version): wheel info or None}, see resolve_release_metadata()."""
+    metadata = resolve_release_metadata(specs, **kw)
+    return {spec: find_wheel_info(data) for spec, data in metadata.items()}
+
+
+def store_path(store, sha256):
+    """Location of a file in the content-addressed store."""
+    return Path(store) / sha256[:2] / sha256
+
+
+def download_to_store(session, url, sha256, store):
+    """
+    Download `url` into the store, verifying its sha256 while streaming.
+
+    A file that is already in the store is not downloaded again.
+    """
+    path = store_path(store, sha256)
+    if path.exists():
+        return path, False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".part")
+    h = hashlib.sha256()
+    with session.get(url, stream=True, timeout=60) as resp:
+        resp.raise_for_status()
+        with open(tmp_path, "wb") as f:
+            for chunk in resp.iter_content(CHUNK_SIZE):
+                h.update(chunk)
+                f.write(chunk)
+
+    if h.hexdigest() != sha256:
+        tmp_path.unlink()
+        raise ValueError(f"sha256 mismatch for {url}")
+    tmp_path.replace(path)
+    return path, True
+
+
+def link_or_copy(src, dst):
+    dst = Path(dst)
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def mirror_wheels(
+    packages, store, target_folder, hosts=MIRROR_HOSTS, max_workers=MAX_WORKERS, stats=None
+):
+    """
+    Mirror the remote wheels of lock `packages` into `target_folder`.
+
+    Wheels are downloaded in parallel into the content-addressed `store`
+    and hardlinked into `target_folder`, then `file_name` is rewritten to
+    the same-origin file name.
+
+    Returns:
+        list: names of the packages that were mirrored.
+    """
+    remote = {
+        name: info
+        for name, info in packages.items()
+        if urlsplit(info["file_name"]).hostname in hosts
+    }
+
+    def mirror(item):
+        name, info = item
+        path, downloaded = download_to_store(session, info["file_name"], info["sha256"], store)
+        file_name = unquote(urlsplit(info["file_name"]).path.rsplit("/", 1)[-1])
+        link_or_copy(path, Path(target_folder) / file_name)
+        return name, file_name, downloaded
+
+    with create_session(max_workers) as session, ThreadPoolExecutor(max_workers) as pool:
+        results = list(pool.map(mirror, sorted(remote.items())))
+
+    for name, file_name, downloaded in results:
+        packages[name]["file_name"] = file_name
+    count = sum(downloaded for *_, downloaded in results)
+    if stats is not None:
+        stats.cache_hits += len(results) - count
+        stats.cache_misses += count
+        stats.bytes_written += sum(
+            store_path(store, packages[name]["sha256"]).stat().st_size
+            for name, _, downloaded in results
+            if downloaded
+        )
+    print(f"mirrored {len(results)} wheels, {count} downloaded, {len(results) - count} from the store")
+    return [name for name, *_ in results]
@@ -0,0 +1,97 @@
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from preload import cell_source
+
+PACKAGE_FOLDER = Path("./packages")
+# the tokenizer is shared with helper.jupyterlite.search, which runs in the kernel
+sys.path.insert(0, str(PACKAGE_FOLDER))
+from helper.text_search import shard_name, tokenize  # noqa: E402
+
+DIST_FOLDER = Path("./dist")
+SEARCH_FOLDER_NAME = "search"
+META_FILE_NAME = "meta.json"
+INDEXED_CELL_TYPES = ("markdown", "code")
+
+
+def dump_compact(obj):
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def notebook_title(nb, path):
+    for cell in nb.get("cells", []):
+        if cell["cell_type"] == "markdown":
+            for line in cell_source(cell).splitlines():
+                if line.startswith("#"):
+                    return line.lstrip("#").strip()
+    return path.stem
+
+
+def index_notebook(path):
+    """Return (title, {term: [[cell index, count], ...]}) of one notebook."""
+    with open(path, encoding="utf-8") as f:
+        nb = json.load(f)
+    terms = {}
+    for i, cell in enumerate(nb.get("cells", [])):
+        if cell["cell_type"] not in INDEXED_CELL_TYPES:
+            continue
+        for term, count in Counter(tokenize(cell_source(cell))).items():
+            terms.setdefault(term, []).append([i, count])
+    return notebook_title(nb, path), terms
+
+
+def write_if_changed(path, text):
+    """Keep the mtime of unchanged shards, so that precompressed files stay valid."""
+    if path.exists() and path.read_text(encoding="utf-8") == text:
+        return False
+    path.write_text(text, encoding="utf-8")
+    return True
+
+
+def build_search_index(dist_folder=DIST_FOLDER):
+    """
+    Write an inverted index of the markdown and code cells of the notebooks
+    in `dist/files` to `dist/api/search`.
+
+    `meta.json` lists the notebooks and the shards, and every shard holds
+    the postings of the terms starting with the same characters, so a query
+    only downloads the shards of its own terms.
+
+    Returns:
+        tuple: (number of rewritten shards, number of unchanged shards)
+    """
+    dist_folder = Path(dist_folder)
+    files_folder = dist_folder / "files"
+    search_folder = dist_folder / "api" / SEARCH_FOLDER_NAME
+    search_folder.mkdir(parents=True, exist_ok=True)
+
+    docs = []
+    shards = {}
+    for path in sorted(files_folder.rglob("*.ipynb")):
+        if ".ipynb_checkpoints" in path.parts:
+            continue
+        title, terms = index_notebook(path)
+        doc = len(docs)
+        docs.append([path.relative_to(files_folder).as_posix(), title])
+        for term, cells in terms.items():
+            postings = shards.setdefault(shard_name(term), {}).setdefault(term, [])
+            postings.extend([doc, cell, count] for cell, count in cells)
+
+    written = 0
+    for name, postings in shards.items():
+        written += write_if_changed(search_folder / f"{name}.json", dump_compact(postings))
+    for stale in set(search_folder.glob("*.json")) - {
+        search_folder / f"{name}.json" for name in [*shards, Path(META_FILE_NAME).stem]
+    }:
+        stale.unlink()
+
+    meta = {"docs": docs, "shards": sorted(shards)}
+    write_if_changed(search_folder / META_FILE_NAME, dump_compact(meta))
+    return written, len(shards) - written
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    written, unchanged = build_search_index(Path(args[0]) if args else DIST_FOLDER)
+    print(f"search index: {written} shards written, {unchanged} unchanged")
@@ -1,3 +1 @@
-cd dist
-python -m http.server
-cd ..
\ No newline at end of file
+python serve.py dist
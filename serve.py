@@ -0,0 +1,237 @@
+import hashlib
+import os
+import re
+import sys
+import time
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DIST_FOLDER = Path("./dist")
+CHUNK_SIZE = 1 << 16
+# precompressed siblings written by compress.py, in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size):
+    """
+    Parse a single byte range.
+
+    Returns:
+        tuple: (start, end) with an inclusive end, None when the header is
+        not a single byte range (the whole file is sent), or "unsatisfiable".
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serve a built site like production does.
+
+    - `.br`/`.gz` files written by compress.py are sent with Content-Encoding
+      when the client accepts them.
+    - Files have strong ETags (the sha256 of their content) and answer
+      If-None-Match, Range and If-Range.
+    - Cross-Origin-Opener-Policy/Cross-Origin-Embedder-Policy make the page
+      cross-origin isolated, so SharedArrayBuffer is available to Pyodide.
+    - Every request is logged with its status, encoding, size and time.
+    """
+
+    protocol_version = "HTTP/1.1"
+    extensions_map = dict(
+        SimpleHTTPRequestHandler.extensions_map,
+        **{
+            ".wasm": "application/wasm",
+            ".whl": "application/zip",
+            ".mjs": "text/javascript",
+            ".js": "text/javascript",
+            ".json": "application/json",
+        },
+    )
+    # {path: (mtime_ns, size, etag)}, shared by all handler threads
+    etags = {}
+    coep = "require-corp"
+
+    def etag(self, path, stat):
+        cached = self.etags.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                h.update(chunk)
+        etag = f'"{h.hexdigest()[:32]}"'
+        self.etags[path] = (stat.st_mtime_ns, stat.st_size, etag)
+        return etag
+
+    def accepted_encodings(self):
+        header = self.headers.get("Accept-Encoding", "")
+        accepted = set()
+        for item in header.split(","):
+            name, _, params = item.partition(";")
+            params = params.replace(" ", "")
+            try:
+                quality = float(params[2:]) if params.startswith("q=") else 1.0
+            except ValueError:
+                quality = 1.0
+            if quality > 0:
+                accepted.add(name.strip().lower())
+        return accepted
+
+    def select_variant(self, path):
+        """Return (file to send, content encoding or None)."""
+        if "Range" not in self.headers:
+            accepted = self.accepted_encodings()
+            source_mtime = os.stat(path).st_mtime_ns
+            for encoding, suffix in ENCODINGS:
+                variant = path + suffix
+                if encoding in accepted and os.path.isfile(variant):
+                    if os.stat(variant).st_mtime_ns >= source_mtime:
+                        return variant, encoding
+        return path, None
+
+    def end_headers(self):
+        if self.coep is not None:
+            self.send_header("Cross-Origin-Opener-Policy", "same-origin")
+            self.send_header("Cross-Origin-Embedder-Policy", self.coep)
+            self.send_header("Cross-Origin-Resource-Policy", "cross-origin")
+        super().end_headers()
+
+    def send_head(self):
+        self.remaining = None
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) or not os.path.isfile(path):
+            # directory redirects, index.html and 404 are handled as usual
+            return super().send_head()
+
+        ctype = self.guess_type(path)
+        file_path, encoding = self.select_variant(path)
+        stat = os.stat(file_path)
+        etag = self.etag(file_path, stat)
+
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return None
+
+        size = stat.st_size
+        byte_range = None
+        if "Range" in self.headers:
+            if_range = self.headers.get("If-Range")
+            if if_range is None or if_range.strip() == etag:
+                byte_range = parse_range(self.headers["Range"], size)
+        if byte_range == "unsatisfiable":
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        f = open(file_path, "rb")
+        try:
+            if byte_range is None:
+                self.send_response(HTTPStatus.OK)
+                length = size
+            else:
+                start, end = byte_range
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                f.seek(start)
+                length = end - start + 1
+                self.sent_range = byte_range
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Cache-Control", "no-cache")
+            if encoding is not None:
+                self.send_header("Content-Encoding", encoding)
+                self.sent_encoding = encoding
+            self.end_headers()
+        except Exception:
+            f.close()
+            raise
+        self.remaining = length
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, "remaining", None)
+        while remaining is None or remaining > 0:
+            chunk = source.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+        self.remaining = None
+
+    def handle_one_request(self):
+        self.start_time = time.perf_counter()
+        self.response_status = None
+        self.response_length = "-"
+        self.sent_range = None
+        self.sent_encoding = None
+        super().handle_one_request()
+        if self.response_status is not None:
+            elapsed = (time.perf_counter() - self.start_time) * 1000
+            encoding = self.sent_encoding or "identity"
+            byte_range = self.sent_range
+            range_text = f" bytes={byte_range[0]}-{byte_range[1]}" if byte_range else ""
+            sys.stderr.write(
+                f"{self.command} {self.path} {self.response_status} {encoding} "
+                f"{self.response_length} B{range_text} {elapsed:.1f} ms\n"
+            )
+
+    def send_header(self, keyword, value):
+        if keyword == "Content-Length":
+            self.response_length = value
+        super().send_header(keyword, value)
+
+    def log_request(self, code="-", size="-"):
+        # logged with the elapsed time once the response is written
+        self.response_status = int(code) if isinstance(code, int) else code
+
+
+def serve(folder=DIST_FOLDER, port=8000, bind="127.0.0.1", coep="require-corp"):
+    handler = partial(DevRequestHandler, directory=str(folder))
+    DevRequestHandler.coep = coep
+    with ThreadingHTTPServer((bind, port), handler) as server:
+        print(f"serving {folder} at http://{bind}:{port}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    # python serve.py [folder] [--port=8000] [--bind=127.0.0.1]
+    #                 [--coep=require-corp|credentialless] [--no-isolation]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = dict(arg[2:].split("=", 1) for arg in sys.argv[1:] if arg.startswith("--") and "=" in arg)
+    serve(
+        Path(args[0]) if args else DIST_FOLDER,
+        port=int(options.get("port", 8000)),
+        bind=options.get("bind", "127.0.0.1"),
+        coep=None if "--no-isolation" in sys.argv else options.get("coep", "require-corp"),
+    )
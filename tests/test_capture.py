@@ -0,0 +1,53 @@
+"""
+The byte budget of helper.polars' DataCapturer and ExprCapturer bounds what
+they hold, including the batches ExprCapturer keeps appending in "full" mode.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+pl = pytest.importorskip("polars")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "packages"))
+from helper.polars import DataCapturer, ExprCapturer, estimated_size  # noqa: E402
+
+BATCH = pl.DataFrame({"a": range(1000)})
+BATCH_SIZE = BATCH["a"].estimated_size()
+BUDGET = 10 * BATCH_SIZE
+
+
+def held_size(cap):
+    return sum(estimated_size(capture.value) for capture in cap._captures.values())
+
+
+def test_expr_capturer_budget_bounds_batches():
+    cap = ExprCapturer(budget=BUDGET)
+    expr = pl.col("a").pipe(cap.a)
+    for _ in range(100):
+        BATCH.select(expr)
+    # polars may add a small dtype probe batch of its own
+    assert cap.report().row(0, named=True)["batches"] >= 100
+    assert held_size(cap) <= BUDGET
+
+
+def test_expr_capturer_budget_bounds_names():
+    cap = ExprCapturer(budget=BUDGET)
+    for i in range(30):
+        expr = pl.col("a").pipe(getattr(cap, f"step{i}"))
+        for _ in range(5):
+            BATCH.select(expr)
+    assert held_size(cap) <= BUDGET
+    kept = cap.report().filter(pl.col("kept"))["name"].to_list()
+    # the most recent captures are the ones kept
+    assert kept == ["step29"]
+    assert len(cap.step29) >= 5
+
+
+def test_data_capturer_budget():
+    cap = DataCapturer(budget=BUDGET)
+    for i in range(30):
+        BATCH.pipe(getattr(cap, f"step{i}"))
+    assert cap._logs.total_size <= BUDGET
+    assert cap.report()["kept"].sum() == 10
@@ -0,0 +1,106 @@
+"""
+download_folder_from_github against a local stand-in of the GitHub API and
+of raw.githubusercontent.com, served by serve.py's DevRequestHandler.
+
+The trees API answer is a static file: the handler drops the query string
+and unquotes the path, so `/api/repos/o/r/git/trees/main%3Adata?recursive=1`
+is the file `api/repos/o/r/git/trees/main:data`.
+"""
+import asyncio
+import json
+import sys
+import threading
+import urllib.error
+import urllib.request
+from functools import partial
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "packages")]
+from serve import DevRequestHandler  # noqa: E402
+from helper.utils import (  # noqa: E402
+    download_folder_from_github,
+    download_folder_from_github_async,
+    git_blob_sha,
+)
+
+FILES = {
+    "a.csv": b"x,y\n1,2\n" * 1000,
+    "sub/b.txt": b"hello\n",
+    "sub/deep/c.bin": bytes(range(256)) * 64,
+}
+GITHUB_URL = "https://github.com/o/r/tree/main/data"
+
+
+@pytest.fixture
+def server(tmp_path):
+    site = tmp_path / "site"
+    tree = []
+    for name, data in FILES.items():
+        path = site / "raw" / "o" / "r" / "main" / "data" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        tree.append({"path": name, "type": "blob", "sha": git_blob_sha(str(path))})
+    tree.append({"path": "sub", "type": "tree", "sha": "0" * 40})
+    trees = site / "api" / "repos" / "o" / "r" / "git" / "trees"
+    trees.mkdir(parents=True)
+    (trees / "main:data").write_text(json.dumps({"tree": tree, "truncated": False}))
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(DevRequestHandler, directory=str(site)))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield {"api_url": f"{base}/api", "raw_url": f"{base}/raw"}
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def check_files(target):
+    for name, data in FILES.items():
+        assert (target / name).read_bytes() == data
+        assert not (target / (name + ".part")).exists()
+
+
+def test_download_skip_and_resume(server, tmp_path):
+    target = tmp_path / "out"
+    summary = download_folder_from_github(GITHUB_URL, str(target), max_workers=4, **server)
+    assert summary == {"downloaded": 3, "resumed": 0, "skipped": 0}
+    check_files(target)
+
+    summary = download_folder_from_github(GITHUB_URL, str(target), **server)
+    assert summary == {"downloaded": 0, "resumed": 0, "skipped": 3}
+
+    (target / "a.csv").unlink()
+    (target / "a.csv.part").write_bytes(FILES["a.csv"][:1000])
+    (target / "sub" / "b.txt").write_bytes(b"changed\n")
+    summary = download_folder_from_github(GITHUB_URL, str(target), **server)
+    assert summary == {"downloaded": 1, "resumed": 1, "skipped": 1}
+    check_files(target)
+
+
+async def urllib_fetch(url, headers):
+    """Stand-in of pyodide.http.pyfetch for the async downloader."""
+
+    def fetch():
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    return await asyncio.to_thread(fetch)
+
+
+def test_async_download(server, tmp_path):
+    target = tmp_path / "out"
+    (target / "sub" / "deep").mkdir(parents=True)
+    (target / "sub" / "deep" / "c.bin.part").write_bytes(FILES["sub/deep/c.bin"][:100])
+    summary = asyncio.run(
+        download_folder_from_github_async(GITHUB_URL, str(target), 2, fetch=urllib_fetch, **server)
+    )
+    assert summary == {"downloaded": 2, "resumed": 1, "skipped": 0}
+    check_files(target)
@@ -0,0 +1,217 @@
+"""
+pypi_resolver against a local stand-in of the PyPI JSON API and of the wheel
+host, served by serve.py's DevRequestHandler: `/pypi/<name>/<version>/json`
+is a static file, answered with a strong ETag and 304 on If-None-Match.
+"""
+import hashlib
+import json
+import sys
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import pypi_resolver  # noqa: E402
+from build_timing import StageStats  # noqa: E402
+from serve import DevRequestHandler  # noqa: E402
+
+RELEASES = {
+    ("demo", "1.0"): {
+        "info": {"name": "demo", "version": "1.0"},
+        "urls": [{"filename": "demo-1.0-py3-none-any.whl", "sha256": "0" * 64}],
+    },
+    ("other", "2.1"): {
+        "info": {"name": "other", "version": "2.1"},
+        "urls": [{"filename": "other-2.1.tar.gz", "sha256": "1" * 64}],
+    },
+}
+WHEELS = {
+    "demo-1.0-py3-none-any.whl": b"PK demo" * 10000,
+    "other-2.1-py3-none-any.whl": b"PK other" * 10000,
+}
+
+
+class RecordingHandler(DevRequestHandler):
+    """Remember (path, status) of every response."""
+
+    requests = None
+
+    def send_response(self, code, message=None):
+        self.requests.append((self.path, int(code)))
+        super().send_response(code, message)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    folder = tmp_path / "cache"
+    monkeypatch.setattr(pypi_resolver, "CACHE_FOLDER", folder)
+    monkeypatch.setattr(pypi_resolver, "CACHE_INDEX_FILE", folder / "index.json")
+    return folder
+
+
+@pytest.fixture
+def server(tmp_path):
+    site = tmp_path / "site"
+    for (name, version), data in RELEASES.items():
+        path = site / "pypi" / name / version / "json"
+        path.parent.mkdir(parents=True)
+        path.write_text(json.dumps(data))
+    for name, data in WHEELS.items():
+        path = site / "wheels" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    requests = []
+    handler = type("Handler", (RecordingHandler,), {"requests": requests})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(site)))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield {"base_url": f"{base}/pypi", "wheel_url": f"{base}/wheels", "requests": requests}
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def resolve(server, **kw):
+    stats = StageStats()
+    metadata = pypi_resolver.resolve_release_metadata(
+        RELEASES, base_url=server["base_url"], stats=stats, **kw
+    )
+    return metadata, stats
+
+
+def test_fetch_then_cache_hit(server, cache):
+    metadata, stats = resolve(server)
+    assert metadata == RELEASES
+    assert (stats.cache_hits, stats.cache_misses) == (0, 2)
+    assert sorted(server["requests"]) == [("/pypi/demo/1.0/json", 200), ("/pypi/other/2.1/json", 200)]
+    assert (cache / "demo@1.0").exists()
+
+    server["requests"].clear()
+    metadata, stats = resolve(server)
+    assert metadata == RELEASES
+    assert (stats.cache_hits, stats.cache_misses) == (2, 0)
+    assert server["requests"] == []
+
+    infos = pypi_resolver.resolve_pythonhosted_infos(RELEASES, base_url=server["base_url"])
+    assert infos[("demo", "1.0")]["filename"] == "demo-1.0-py3-none-any.whl"
+    assert infos[("other", "2.1")] is None
+
+
+def test_revalidate_after_ttl(server, cache):
+    resolve(server)
+    fetched = json.loads((cache / "index.json").read_text())["demo@1.0"]["fetched"]
+
+    server["requests"].clear()
+    metadata, stats = resolve(server, ttl=0)
+    assert metadata == RELEASES
+    assert (stats.cache_hits, stats.cache_misses) == (2, 0)
+    assert sorted(server["requests"]) == [("/pypi/demo/1.0/json", 304), ("/pypi/other/2.1/json", 304)]
+    entry = json.loads((cache / "index.json").read_text())["demo@1.0"]
+    assert entry["etag"] and entry["fetched"] >= fetched
+
+
+def test_offline(server, cache):
+    metadata, stats = resolve(server, offline=True)
+    assert metadata == {spec: None for spec in RELEASES}
+    assert (stats.cache_hits, stats.cache_misses) == (0, 2)
+    assert server["requests"] == []
+
+    resolve(server)
+    server["requests"].clear()
+    metadata, stats = resolve(server, offline=True, ttl=0)
+    assert metadata == RELEASES
+    assert (stats.cache_hits, stats.cache_misses) == (2, 0)
+    assert server["requests"] == []
+
+
+def test_unreachable_server_uses_stale_cache(server, cache):
+    resolve(server)
+    # nothing listens on the port of a closed server
+    closed = ThreadingHTTPServer(("127.0.0.1", 0), DevRequestHandler)
+    port = closed.server_address[1]
+    closed.server_close()
+
+    metadata, stats = resolve({"base_url": f"http://127.0.0.1:{port}/pypi"}, ttl=0)
+    assert metadata == RELEASES
+    assert (stats.cache_hits, stats.cache_misses) == (0, 2)
+
+    pypi_resolver.CACHE_INDEX_FILE.unlink()
+    for spec in RELEASES:
+        pypi_resolver.cache_file_name(*spec).unlink()
+    metadata, stats = resolve({"base_url": f"http://127.0.0.1:{port}/pypi"})
+    assert metadata == {spec: None for spec in RELEASES}
+    assert (stats.cache_hits, stats.cache_misses) == (0, 2)
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_download_sha256_mismatch(server, tmp_path):
+    store = tmp_path / "store"
+    url = f"{server['wheel_url']}/demo-1.0-py3-none-any.whl"
+    with pypi_resolver.create_session() as session:
+        with pytest.raises(ValueError, match="sha256 mismatch"):
+            pypi_resolver.download_to_store(session, url, "ab" * 32, store)
+    assert [path for path in store.rglob("*") if path.is_file()] == []
+
+
+def test_download_reuses_store(server, tmp_path):
+    store = tmp_path / "store"
+    data = WHEELS["demo-1.0-py3-none-any.whl"]
+    url = f"{server['wheel_url']}/demo-1.0-py3-none-any.whl"
+    with pypi_resolver.create_session() as session:
+        path, downloaded = pypi_resolver.download_to_store(session, url, sha256(data), store)
+        assert downloaded and path.read_bytes() == data
+        assert path == pypi_resolver.store_path(store, sha256(data))
+
+        server["requests"].clear()
+        again, downloaded = pypi_resolver.download_to_store(session, url, sha256(data), store)
+    assert (again, downloaded) == (path, False)
+    assert server["requests"] == []
+
+
+def test_mirror_wheels(server, tmp_path):
+    store = tmp_path / "store"
+    packages = {
+        name.split("-")[0]: {"file_name": f"{server['wheel_url']}/{name}", "sha256": sha256(data)}
+        for name, data in WHEELS.items()
+    }
+    packages["local"] = {"file_name": "local-0.1-py3-none-any.whl", "sha256": "2" * 64}
+
+    target = tmp_path / "first"
+    target.mkdir()
+    stats = StageStats()
+    mirrored = pypi_resolver.mirror_wheels(
+        packages, store, target, hosts=("127.0.0.1",), max_workers=2, stats=stats
+    )
+    assert mirrored == ["demo", "other"]
+    assert (stats.cache_hits, stats.cache_misses) == (0, 2)
+    assert stats.bytes_written == sum(map(len, WHEELS.values()))
+    for name, data in WHEELS.items():
+        assert (target / name).read_bytes() == data
+    assert packages["demo"]["file_name"] == "demo-1.0-py3-none-any.whl"
+    assert packages["local"]["file_name"] == "local-0.1-py3-none-any.whl"
+
+    # a second site reuses the wheels of the store
+    packages = {
+        name.split("-")[0]: {"file_name": f"{server['wheel_url']}/{name}", "sha256": sha256(data)}
+        for name, data in WHEELS.items()
+    }
+    target = tmp_path / "second"
+    target.mkdir()
+    server["requests"].clear()
+    stats = StageStats()
+    pypi_resolver.mirror_wheels(packages, store, target, hosts=("127.0.0.1",), stats=stats)
+    assert (stats.cache_hits, stats.cache_misses) == (2, 0)
+    assert server["requests"] == []
+    for name, data in WHEELS.items():
+        assert (target / name).read_bytes() == data
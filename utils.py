@@ -1,41 +1,71 @@
-import base64
 import zipfile
 import json
 import hashlib
 import shutil
-from dataclasses import dataclass, field
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-import requests
+from pypi_resolver import (
+    find_wheel_info,
+    mirror_wheels,
+    resolve_release_metadata,
+)
+from wheels import slim_wheels, write_bytes_to_zip, write_file_to_zip, zip_info
+from build_timing import BuildTimer, StageStats
+from compress import precompress_folder
+from font_cache import add_font_cache
+from preload import build_preload_manifest
+from dependencies import DependencyGraph, merge_depends, read_release_requires, read_wheel_requires
 
 PYODIDE_FOLDER = Path("./dist/static/pyodide")
 WHL_PACKAGE_FOLDER = Path("./whl_packages")
 PACKAGE_FOLDER = Path("./packages")
 PYODIDE_LOCK_FILE = PYODIDE_FOLDER / "pyodide-lock.json"
 PYODIDE_VERSION = "v0.27.7"
-
-
-def find_pythonhosted_info(pkg_name: str, version: str) -> dict:
-    cache_folder = Path("./request_cach")
-    if not cache_folder.exists():
-        cache_folder.mkdir()
-
-    pkg_file_name = cache_folder / pkg_name
-    if pkg_file_name.exists():
-        with open(pkg_file_name, encoding="utf-8") as f:
-            data = json.load(f)
-    else:
-        resp = requests.get(f"https://pypi.org/pypi/{pkg_name}/json", timeout=10)
-        if resp.status_code != 200:
-            return None
-        with open(pkg_file_name, "w", encoding="utf-8") as f:
-            f.write(resp.text)
-        data = resp.json()
-
-    file_infos = data["releases"].get(version, [])
-    for info in file_infos:
-        if info["filename"].endswith(".whl"):
-            return info
-    return None
+LOAD_WAVES_FILE = PYODIDE_FOLDER / "load-waves.json"
+PRELOAD_FILE = PYODIDE_FOLDER / "preload.json"
+CONTENT_FOLDER = Path("./content")
+WHEEL_MANIFEST_FILE = WHL_PACKAGE_FOLDER / "wheel_manifest.json"
+SLIM_WHL_FOLDER = Path("./whl_slim")
+WHEEL_STORE_FOLDER = Path("./wheel_store")
+
+# Files removed from every shipped wheel, matched against the path inside the wheel.
+STRIP_PATTERNS = [
+    "tests/*",
+    "*/tests/*",
+    "*/docs/*",
+    "*/examples/*",
+    "*.pyi",
+    "*/__pycache__/*",
+]
+
+# Lock packages kept by `python utils.py patch --prune` besides the added ones
+# and the ones imported by the notebooks.
+KEEP_PACKAGES = [
+    "micropip",
+    "numpy",
+    "pandas",
+    "scipy",
+    "pyarrow",
+    "polars",
+    "pillow",
+    "opencv-python",
+    "cffi",
+    "networkx",
+    "scikit-image",
+    "scikit-learn",
+    "python-sat",
+    "shapely",
+]
+
+# Extra patterns per package name, e.g. {"matplotlib": ["*/sample_data/*"]}.
+PACKAGE_STRIP_PATTERNS = {}
+
+# Dependencies that are not declared by the wheels but should be loaded with them.
+EXTRA_DEPENDS = {
+    "polars": ["numpy", "pyarrow", "openpyxl"],
+}
 
 
 def sha256sum(path):
@@ -47,14 +77,13 @@ def sha256sum(path):
     return h.hexdigest()
 
 
-def record_entry(path):
-    """Generate a RECORD entry with sha256 and size."""
-    with open(path, "rb") as f:
-        data = f.read()
-    digest = hashlib.sha256(data).digest()
-    hash_b64 = base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
-    size = len(data)
-    return f"{path},sha256={hash_b64},{size}"
+def iter_package_files(package_dir, ignore_files=()):
+    """Yield the files of a package folder in a stable order."""
+    files = []
+    for root, dirs, names in package_dir.walk():
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        files.extend(root / name for name in names if name not in ignore_files)
+    return sorted(files, key=lambda p: p.relative_to(package_dir).as_posix())
 
 
 def make_wheel(
@@ -66,71 +95,160 @@ def make_wheel(
     abi_tag="none",
     platform_tag="any",
     ignore_files=[],
+    digests=None,
 ):
+    """
+    Zip a package folder into a pure Python wheel, return its path.
+
+    `digests` receives {file path: sha256 hexdigest} of the package files,
+    taken while they are compressed.
+    """
     package_dir = Path(package_dir)
     # Verify package_dir exists
     if not package_dir.is_dir():
         print(f"Error: directory '{package_dir}' does not exist.")
         return
 
-    dist_info_dir = Path(f"{package_name}-{version}.dist-info")
-    dist_info_dir.mkdir(exist_ok=True)
+    dist_info_dir = f"{package_name}-{version}.dist-info"
 
-    # Create WHEEL file
     wheel_text = f"""Wheel-Version: 1.0
 Generator: manual
 Root-Is-Purelib: true
 Tag: {py_tag}-{abi_tag}-{platform_tag}
 """
-    with open(dist_info_dir / "WHEEL", "w") as f:
-        f.write(wheel_text)
 
-    # Create METADATA file
     metadata_text = f"""Metadata-Version: 2.1
 Name: {package_name}
 Version: {version}
 Summary: {package_name} packaged manually
 """
-    with open(dist_info_dir / "METADATA", "w") as f:
-        f.write(metadata_text)
-
-    # Gather all files
-    all_files = []
-    for root, _, files in package_dir.walk():
-        for file in files:
-            all_files.append(root / file)
-    for root, _, files in dist_info_dir.walk():
-        for file in files:
-            all_files.append(root / file)
-
-    # Create RECORD file
-    record_path = dist_info_dir / "RECORD"
-    with open(record_path, "w") as f:
-        for file in all_files:
-            f.write(record_entry(file) + "\n")
-        f.write(f"{dist_info_dir}/RECORD,,\n")
 
     # Name the wheel file
     wheel_filename = f"{package_name}-{version}-{py_tag}-{abi_tag}-{platform_tag}.whl"
+    wheel_path = Path(target_dir) / wheel_filename
+    tmp_path = wheel_path.with_suffix(".whl.tmp")
+
+    # Zip everything, the RECORD is collected while the files are compressed
+    records = []
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for file in iter_package_files(package_dir, ignore_files):
+            arcname = file.relative_to(package_dir.parent).as_posix()
+            records.append(write_file_to_zip(zf, file, arcname, digests))
+        records.append(write_bytes_to_zip(zf, metadata_text.encode(), f"{dist_info_dir}/METADATA"))
+        records.append(write_bytes_to_zip(zf, wheel_text.encode(), f"{dist_info_dir}/WHEEL"))
+        records.append(f"{dist_info_dir}/RECORD,,")
+        zf.writestr(zip_info(f"{dist_info_dir}/RECORD"), "\n".join(records) + "\n")
+
+    tmp_path.replace(wheel_path)
+    print(f"Wheel file created: {wheel_filename}")
+    return wheel_path
+
+
+def scan_package_files(package_dir, old_files):
+    """
+    Return {relative path: [mtime_ns, size, sha256]} for a package folder.
+
+    Files whose mtime and size are unchanged since the last build reuse the
+    stored hash. The hash of a touched file is None: it is not read here,
+    the wheel build hashes it while compressing it.
+    """
+    files = {}
+    for path in iter_package_files(package_dir):
+        rel = path.relative_to(package_dir).as_posix()
+        st = path.stat()
+        old = old_files.get(rel)
+        if old is not None and old[0] == st.st_mtime_ns and old[1] == st.st_size:
+            digest = old[2]
+        else:
+            digest = None
+        files[rel] = [st.st_mtime_ns, st.st_size, digest]
+    return files
 
-    # Zip everything
-    with zipfile.ZipFile(
-        Path(target_dir) / wheel_filename, "w", zipfile.ZIP_DEFLATED
-    ) as zf:
-        for file in all_files:
-            file_path = Path(file)
-            if file_path.name in ignore_files:
-                continue
 
-            if file_path.is_relative_to(package_dir):
-                arcname = file_path.relative_to(package_dir.parent)
-            else:
-                arcname = file
-            zf.write(file, arcname=arcname)
+def build_package_wheel(package_dir, version, target_dir, old_entry, force=False):
+    """
+    Build one package folder unless its files match the manifest entry.
 
-    shutil.rmtree(dist_info_dir)
+    Returns:
+        tuple: (package name, manifest entry, built, StageStats)
+    """
+    start = time.perf_counter()
+    stats = StageStats()
+    package_dir = Path(package_dir)
+    old_entry = old_entry or {}
+    files = scan_package_files(package_dir, old_entry.get("files", {}))
+    wheel_path = Path(target_dir) / old_entry.get("wheel", "")
+
+    unchanged = (
+        not force
+        and old_entry.get("version") == version
+        and files.keys() == old_entry.get("files", {}).keys()
+        and all(digest is not None for _, _, digest in files.values())
+        and wheel_path.is_file()
+        and sha256sum(wheel_path) == old_entry.get("sha256")
+    )
+    if unchanged:
+        stats.cache_hits += 1
+        stats.bytes_read += wheel_path.stat().st_size
+        stats.seconds = time.perf_counter() - start
+        return package_dir.name, dict(old_entry, files=files), False, stats
+
+    digests = {}
+    wheel_path = make_wheel(package_dir, package_dir.name, version, target_dir=target_dir, digests=digests)
+    for rel, info in files.items():
+        info[2] = digests[package_dir / rel]
+    entry = {
+        "version": version,
+        "wheel": wheel_path.name,
+        "sha256": sha256sum(wheel_path),
+        "files": files,
+    }
+    stats.cache_misses += 1
+    stats.bytes_read += sum(size for _, size, _ in files.values())
+    stats.bytes_written += wheel_path.stat().st_size
+    stats.seconds = time.perf_counter() - start
+    return package_dir.name, entry, True, stats
+
+
+def load_wheel_manifest():
+    if WHEEL_MANIFEST_FILE.exists():
+        with open(WHEEL_MANIFEST_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def build_local_wheels(version="1.0.0", force=False, max_workers=None, timer=None):
+    """
+    Build every folder under PACKAGE_FOLDER into WHL_PACKAGE_FOLDER in parallel.
+
+    Packages whose files have not changed since the last run are skipped.
+    """
+    WHL_PACKAGE_FOLDER.mkdir(exist_ok=True)
+    manifest = load_wheel_manifest()
+    folders = sorted(folder for folder in PACKAGE_FOLDER.iterdir() if folder.is_dir())
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(
+                build_package_wheel,
+                folder,
+                version,
+                WHL_PACKAGE_FOLDER,
+                manifest.get(folder.name),
+                force,
+            )
+            for folder in folders
+        ]
+        for future in as_completed(futures):
+            name, entry, built, stats = future.result()
+            manifest[name] = entry
+            if timer is not None:
+                timer.add(f"wheel:{name}", **asdict(stats))
+            print(f"make whl: {name} ({'built' if built else 'unchanged'})")
 
-    print(f"Wheel file created: {wheel_filename}")
+    with open(WHEEL_MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    return manifest
 
 
 @dataclass
@@ -143,12 +261,15 @@ class Package:
     file_name: str = ""
 
     def __post_init__(self):
-        if not self.file_name:
-            info = find_pythonhosted_info(self.name, self.version)
-            self.sha256 = info["digests"]["sha256"]
-            self.file_name = info["url"]
-        else:
-            self.sha256 = sha256sum(WHL_PACKAGE_FOLDER / self.file_name)
+        # pythonhosted packages are filled in by resolve_pypi_packages()
+        if self.file_name:
+            self.sha256 = sha256sum(SLIM_WHL_FOLDER / self.file_name)
+
+    def update_from_info(self, info):
+        if info is None:
+            raise ValueError(f"no wheel found for {self.name}=={self.version}")
+        self.sha256 = info["digests"]["sha256"]
+        self.file_name = info["url"]
 
     @property
     def json(self):
@@ -421,9 +542,11 @@ def get_local_packages():
     ]
 
 
-def patch_pyodide_lock_file_names():
+def patch_pyodide_lock_file_names(prune=False, stats=None):
     with open(PYODIDE_LOCK_FILE) as f:
         data = json.load(f)
+    if stats is not None:
+        stats.bytes_read += PYODIDE_LOCK_FILE.stat().st_size
 
     for name, info in data["packages"].items():
         file_name = info["file_name"]
@@ -432,22 +555,129 @@ def patch_pyodide_lock_file_names():
                 f"https://cdn.jsdelivr.net/pyodide/{PYODIDE_VERSION}/full/{file_name}"
             )
 
+    extra_names = set()
     for json_name in ["pypi", "local"]:
         extra_packages_file_name = Path(f"./{json_name}_packages.json")
         if extra_packages_file_name.exists():
             with open(extra_packages_file_name, "r", encoding="utf-8") as f:
                 packages = json.load(f)
                 data["packages"].update(packages)
+                extra_names.update(packages)
+
+    extra_names = list(extra_names)
+    for name, depends in EXTRA_DEPENDS.items():
+        if name in data["packages"]:
+            info = data["packages"][name]
+            info["depends"] = merge_depends(info["depends"], depends)
+            extra_names.append(name)
+
+    graph = check_lock_dependencies(data["packages"], extra_names)
+    verify_local_files(data["packages"])
+
+    preload = build_preload_manifest(CONTENT_FOLDER, PACKAGE_FOLDER, graph)
+    with open(PRELOAD_FILE, "w", encoding="utf-8") as f:
+        json.dump(preload, f, separators=(",", ":"))
+
+    notebook_packages = sorted({name for names in preload.values() for name in names})
+    roots = extra_names + KEEP_PACKAGES + notebook_packages if prune else None
+    dropped = prune_lock(graph, roots)
+    if dropped:
+        print(f"drop {len(dropped)} unused packages from pyodide-lock.json")
+
+    with open(PYODIDE_LOCK_FILE, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    if stats is not None:
+        stats.bytes_written += PYODIDE_LOCK_FILE.stat().st_size
+
+
+def verify_local_files(packages, verified=()):
+    """
+    Check that the sha256 of every local wheel matches the file in PYODIDE_FOLDER.
+
+    The files of the packages named in `verified` are not read again, such
+    as the wheels linked from the store, which only holds files whose sha256
+    was checked while they were downloaded.
+    """
+    errors = []
+    for name, info in packages.items():
+        if info["file_name"].startswith("https://"):
+            continue
+        path = PYODIDE_FOLDER / info["file_name"]
+        if not path.exists():
+            errors.append(f"{name}: {path} does not exist")
+        elif name not in verified and sha256sum(path) != info["sha256"]:
+            errors.append(f"{name}: sha256 of {path} does not match")
+    if errors:
+        raise ValueError("invalid pyodide-lock.json:\n" + "\n".join(errors))
+
+
+def prune_lock(graph, roots=None):
+    """
+    Remove the lock entries that are not in the dependency closure of `roots`.
+
+    Without roots every package is kept except unvendored test packages
+    that nothing depends on.
+    """
+    packages = graph.packages
+    if roots is None:
+        roots = [
+            name for name, info in packages.items()
+            if not (name.endswith("-tests") and info.get("package_type") == "package")
+        ]
+    keep = graph.closure(roots)
+    dropped = sorted(set(packages) - keep)
+    for name in dropped:
+        del packages[name]
+    return dropped
+
+
+def check_lock_dependencies(packages, names):
+    """
+    Map the depends of `names` to lock keys, report missing and cyclic
+    dependencies and write the load waves of every package to LOAD_WAVES_FILE.
+    """
+    graph = DependencyGraph(packages)
+    for name, missing in graph.fix_depends(names).items():
+        print(f"⚠️ {name}: dependencies not in pyodide-lock.json: {', '.join(missing)}")
+    for cycle in graph.cycles(names):
+        print(f"⚠️ dependency cycle: {' -> '.join(cycle)}")
+
+    waves = {name: graph.load_waves([name]) for name in sorted(names)}
+    with open(LOAD_WAVES_FILE, "w", encoding="utf-8") as f:
+        json.dump(waves, f, separators=(",", ":"))
+    return graph
+
+
+def mirror_lock_wheels(stats=None):
+    """Serve the pythonhosted wheels of the lock from PYODIDE_FOLDER."""
+    with open(PYODIDE_LOCK_FILE, encoding="utf-8") as f:
+        data = json.load(f)
+
+    mirrored = mirror_wheels(data["packages"], WHEEL_STORE_FOLDER, PYODIDE_FOLDER, stats=stats)
+    verify_local_files(data["packages"], verified=set(mirrored))
+
+    with open(PYODIDE_LOCK_FILE, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
 
-    data["packages"]["polars"]["depends"] = ["numpy", "pyarrow", "openpyxl"]
 
-    with open(PYODIDE_LOCK_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+def resolve_pypi_packages(packs, offline=False, stats=None):
+    """
+    Fill in file_name and sha256 of all pythonhosted packages at once, and
+    add the Requires-Dist of each release to its depends.
+    """
+    metadata = resolve_release_metadata(
+        [(pack.name, pack.version) for pack in packs], offline=offline, stats=stats
+    )
+    for pack in packs:
+        data = metadata[pack.name, pack.version]
+        pack.update_from_info(find_wheel_info(data))
+        pack.depends = merge_depends(pack.depends, read_release_requires(data))
+    return packs
 
 
-def create_pypi_packages():
+def create_pypi_packages(offline=False, stats=None):
     packages = {}
-    for pack in get_pypi_packages():
+    for pack in resolve_pypi_packages(get_pypi_packages(), offline=offline, stats=stats):
         packages[pack.name] = pack.json
 
     with open("./pypi_packages.json", "w", encoding="utf-8") as f:
@@ -457,6 +687,8 @@ def create_pypi_packages():
 def create_local_packages():
     packages = {}
     for pack in get_local_packages():
+        requires = read_wheel_requires(SLIM_WHL_FOLDER / pack.file_name)
+        pack.depends = merge_depends(pack.depends, requires)
         packages[pack.name] = pack.json
 
     with open("./local_packages.json", "w", encoding="utf-8") as f:
@@ -466,22 +698,64 @@ def create_local_packages():
 if __name__ == "__main__":
     import sys
 
+    timer = BuildTimer(" ".join(sys.argv[1:]))
+
     if sys.argv[1] == "patch":
-        for folder in PACKAGE_FOLDER.iterdir():
-            if folder.is_dir():
-                print(f"make whl: {folder}")
-                make_wheel(folder, folder.name, "1.0.0", target_dir=WHL_PACKAGE_FOLDER)
+        with timer.stage("build wheels"):
+            build_local_wheels(force="--force" in sys.argv, timer=timer)
+
+        print("slim wheels")
+        with timer.stage("slim wheels") as stats:
+            slim_wheels(
+                WHL_PACKAGE_FOLDER,
+                SLIM_WHL_FOLDER,
+                STRIP_PATTERNS,
+                PACKAGE_STRIP_PATTERNS,
+                compile_pyc="--compile" in sys.argv,
+                stats=stats,
+            )
+
+        print("prebuild matplotlib font cache")
+        with timer.stage("font cache") as stats:
+            cjk_font = next(
+                (Path(arg.split("=", 1)[1]) for arg in sys.argv if arg.startswith("--cjk-font=")),
+                None,
+            )
+            for wheel in SLIM_WHL_FOLDER.glob("matplotlib-*.whl"):
+                add_font_cache(wheel, cjk_font, [CONTENT_FOLDER, PACKAGE_FOLDER / "helper"], stats=stats)
 
         print("create local packages")
-        create_local_packages()
+        with timer.stage("create local packages"):
+            create_local_packages()
+
+        with timer.stage("copy wheels") as stats:
+            for src_fn in SLIM_WHL_FOLDER.glob("*.whl"):
+                dst_fn = PYODIDE_FOLDER / src_fn.name
+                print(f"copy {src_fn} to {dst_fn}")
+                shutil.copy(src_fn, dst_fn)
+                stats.bytes_read += src_fn.stat().st_size
+                stats.bytes_written += src_fn.stat().st_size
 
         print("patch pyodide_lock.json")
-        patch_pyodide_lock_file_names()
-        for src_fn in WHL_PACKAGE_FOLDER.glob("*.whl"):
-            dst_fn = PYODIDE_FOLDER / src_fn.name
-            print(f"copy {src_fn} to {dst_fn}")
-            shutil.copy(src_fn, dst_fn)
+        with timer.stage("patch lock") as stats:
+            patch_pyodide_lock_file_names(prune="--prune" in sys.argv, stats=stats)
+
+        print("precompress static/pyodide")
+        with timer.stage("precompress") as stats:
+            precompress_folder(PYODIDE_FOLDER, stats=stats)
+
+    elif sys.argv[1] == "mirror":
+        print("mirror pythonhosted wheels")
+        with timer.stage("mirror wheels") as stats:
+            mirror_lock_wheels(stats=stats)
+
+        print("precompress static/pyodide")
+        with timer.stage("precompress") as stats:
+            precompress_folder(PYODIDE_FOLDER, stats=stats)
 
     elif sys.argv[1] == "create":
         print("create extra packages")
-        create_pypi_packages()
+        with timer.stage("resolve metadata") as stats:
+            create_pypi_packages(offline="--offline" in sys.argv, stats=stats)
+
+    timer.write()
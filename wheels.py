@@ -0,0 +1,254 @@
+import base64
+import hashlib
+import importlib.util
+import json
+import marshal
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fnmatch import fnmatch
+from pathlib import Path
+
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+CHUNK_SIZE = 1 << 16
+PYODIDE_PYTHON = (3, 12)
+SLIM_MANIFEST_NAME = "slim_manifest.json"
+
+
+def record_hash(digest):
+    """Encode a sha256 digest the way RECORD files expect it."""
+    return "sha256=" + base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def zip_info(arcname):
+    """Create a ZipInfo with a fixed timestamp so that wheels are reproducible."""
+    info = zipfile.ZipInfo(str(arcname), date_time=ZIP_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def stream_to_zip(zf, src, arcname):
+    """Hash and compress a file object in one streaming pass, return (sha256 digest, size)."""
+    h = hashlib.sha256()
+    size = 0
+    with zf.open(zip_info(arcname), "w") as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+            dst.write(chunk)
+            size += len(chunk)
+    return h.digest(), size
+
+
+def write_stream_to_zip(zf, src, arcname):
+    """Hash and compress a file object in one streaming pass, return its RECORD entry."""
+    digest, size = stream_to_zip(zf, src, arcname)
+    return f"{arcname},{record_hash(digest)},{size}"
+
+
+def write_file_to_zip(zf, path, arcname, digests=None):
+    """
+    Like `write_stream_to_zip` for a file, `digests` receives
+    {path: sha256 hexdigest} from the same pass.
+    """
+    with open(path, "rb") as src:
+        digest, size = stream_to_zip(zf, src, arcname)
+    if digests is not None:
+        digests[path] = digest.hex()
+    return f"{arcname},{record_hash(digest)},{size}"
+
+
+def write_bytes_to_zip(zf, data, arcname):
+    zf.writestr(zip_info(arcname), data)
+    return f"{arcname},{record_hash(hashlib.sha256(data).digest())},{len(data)}"
+
+
+def compile_source(source, arcname):
+    """
+    Compile a module to an unchecked hash-based pyc (PEP 552).
+
+    Unchecked pycs are used without comparing them to the source, so the
+    import does not stat the .py file. The header is the magic number, the
+    flags (bit 0: hash-based, bit 1: checked) and the source hash.
+    """
+    code = compile(source, arcname, "exec", dont_inherit=True)
+    flags = (0b01).to_bytes(4, "little")
+    return importlib.util.MAGIC_NUMBER + flags + importlib.util.source_hash(source) + marshal.dumps(code)
+
+
+def pyc_arcname(arcname):
+    folder, _, name = arcname.rpartition("/")
+    pyc_name = f"{name[:-3]}.{sys.implementation.cache_tag}.pyc"
+    return f"{folder}/__pycache__/{pyc_name}" if folder else f"__pycache__/{pyc_name}"
+
+
+def find_dist_info(names):
+    return next(
+        name.split("/")[0]
+        for name in names
+        if name.count("/") == 1 and name.endswith(".dist-info/RECORD")
+    )
+
+
+def slim_wheel(src_path, dst_path, patterns=(), compile_pyc=False):
+    """
+    Repack a wheel without the files matching `patterns`.
+
+    The RECORD file is regenerated. With `compile_pyc` every module also
+    gets a `__pycache__` entry so that it is not compiled on import.
+
+    Returns:
+        dict: sizes before and after, and the number of removed and compiled files.
+    """
+    src_path = Path(src_path)
+    dst_path = Path(dst_path)
+    tmp_path = dst_path.with_suffix(".whl.tmp")
+    result = {"removed": 0, "compiled": 0}
+
+    with zipfile.ZipFile(src_path) as zin, zipfile.ZipFile(tmp_path, "w") as zout:
+        names = zin.namelist()
+        dist_info = find_dist_info(names)
+        records = []
+        for name in names:
+            if name.endswith("/") or name.startswith(f"{dist_info}/RECORD"):
+                continue
+            if any(fnmatch(name, pattern) for pattern in patterns):
+                result["removed"] += 1
+                continue
+
+            with zin.open(name) as src:
+                records.append(write_stream_to_zip(zout, src, name))
+
+            if compile_pyc and name.endswith(".py") and ".dist-info/" not in name and ".data/" not in name:
+                try:
+                    pyc = compile_source(zin.read(name), name)
+                except (SyntaxError, ValueError) as e:
+                    print(f"⚠️ Cannot compile {src_path.name}:{name}: {e}")
+                    continue
+                records.append(write_bytes_to_zip(zout, pyc, pyc_arcname(name)))
+                result["compiled"] += 1
+
+        records.append(f"{dist_info}/RECORD,,")
+        zout.writestr(zip_info(f"{dist_info}/RECORD"), "\n".join(records) + "\n")
+
+    tmp_path.replace(dst_path)
+    result["size_before"] = src_path.stat().st_size
+    result["size_after"] = dst_path.stat().st_size
+    return result
+
+
+def add_files_to_wheel(wheel_path, files):
+    """
+    Rewrite a wheel in place with extra files, {arcname: bytes}.
+
+    Entries with the same name are replaced and the RECORD file is
+    regenerated.
+    """
+    wheel_path = Path(wheel_path)
+    tmp_path = wheel_path.with_suffix(".whl.tmp")
+
+    with zipfile.ZipFile(wheel_path) as zin, zipfile.ZipFile(tmp_path, "w") as zout:
+        names = zin.namelist()
+        dist_info = find_dist_info(names)
+        records = []
+        for name in names:
+            if name.endswith("/") or name == f"{dist_info}/RECORD" or name in files:
+                continue
+            with zin.open(name) as src:
+                records.append(write_stream_to_zip(zout, src, name))
+
+        for arcname, data in sorted(files.items()):
+            records.append(write_bytes_to_zip(zout, data, arcname))
+
+        records.append(f"{dist_info}/RECORD,,")
+        zout.writestr(zip_info(f"{dist_info}/RECORD"), "\n".join(records) + "\n")
+
+    tmp_path.replace(wheel_path)
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def slim_wheels(
+    src_folder,
+    dst_folder,
+    patterns,
+    package_patterns=None,
+    compile_pyc=False,
+    max_workers=None,
+    stats=None,
+):
+    """
+    Slim every wheel of `src_folder` into `dst_folder` in parallel.
+
+    Wheels whose source, strip rules and compile flag are unchanged since
+    the last run are not repacked again.
+
+    Parameters:
+        patterns: fnmatch patterns removed from every wheel.
+        package_patterns: {distribution name: extra patterns}.
+        compile_pyc: Add precompiled modules, only possible when running
+            the same Python version as Pyodide.
+        stats: Optional StageStats that receives sizes and cache hits.
+    """
+    src_folder = Path(src_folder)
+    dst_folder = Path(dst_folder)
+    dst_folder.mkdir(exist_ok=True)
+    package_patterns = package_patterns or {}
+
+    if compile_pyc and sys.version_info[:2] != PYODIDE_PYTHON:
+        print(
+            f"⚠️ Skipping pyc compilation: running Python {sys.version_info[0]}.{sys.version_info[1]}, "
+            f"Pyodide needs {PYODIDE_PYTHON[0]}.{PYODIDE_PYTHON[1]}"
+        )
+        compile_pyc = False
+
+    manifest_file = dst_folder / SLIM_MANIFEST_NAME
+    manifest = {}
+    if manifest_file.exists():
+        with open(manifest_file, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    wheels = sorted(src_folder.glob("*.whl"))
+    for stale in set(dst_folder.glob("*.whl")) - {dst_folder / w.name for w in wheels}:
+        stale.unlink()
+        manifest.pop(stale.name, None)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for wheel in wheels:
+            rules = list(patterns) + package_patterns.get(wheel.name.split("-")[0], [])
+            key = {
+                "source_sha256": file_sha256(wheel),
+                "patterns": rules,
+                "compile_pyc": compile_pyc,
+            }
+            old = manifest.get(wheel.name, {})
+            if (dst_folder / wheel.name).exists() and all(old.get(k) == v for k, v in key.items()):
+                if stats is not None:
+                    stats.cache_hits += 1
+                continue
+            future = pool.submit(slim_wheel, wheel, dst_folder / wheel.name, rules, compile_pyc)
+            futures[future] = (wheel.name, key)
+
+        for future in as_completed(futures):
+            name, key = futures[future]
+            result = future.result()
+            manifest[name] = dict(key, **result)
+            print(
+                f"slim {name}: {result['size_before']} -> {result['size_after']} bytes, "
+                f"{result['removed']} removed, {result['compiled']} compiled"
+            )
+            if stats is not None:
+                stats.cache_misses += 1
+                stats.bytes_read += result["size_before"]
+                stats.bytes_written += result["size_after"]
+
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    return manifest